@@ -18,12 +18,13 @@ except ImportError:
 class CalendarAgent(BaseAgent):
     """行事曆 Agent - 處理時間查詢和會議安排"""
     
-    def __init__(self):
+    def __init__(self, http_async_client: Optional[Any] = None):
         super().__init__(
             name="CalendarAgent",
             description="AI 行事曆助理，專門處理時間查詢、空檔查找和會議安排"
         )
-        self.llm = LLMFactory.get_calendar_agent_llm()
+        # 可傳入共用的 httpx.AsyncClient 以重用 keep-alive 連線，未傳入時由 ChatOpenAI 自行建立
+        self.llm = LLMFactory.get_calendar_agent_llm(http_async_client=http_async_client)
         self.use_google_calendar = HAS_GOOGLE_CALENDAR and os.getenv("GOOGLE_CALENDAR_CREDENTIALS_FILE")
         
         if self.use_google_calendar:
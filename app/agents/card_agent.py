@@ -10,17 +10,19 @@ import re
 class CardAgent(BaseAgent):
     """名片 Agent - 處理名片 OCR 和資訊提取"""
     
-    def __init__(self):
+    def __init__(self, http_async_client: Optional[Any] = None):
         super().__init__(
             name="CardAgent",
             description="AI 名片識別助理，專門處理名片圖片分析和客戶資訊提取"
         )
-        self.llm = LLMFactory.get_card_agent_llm()
+        # 可傳入共用的 httpx.AsyncClient 以重用 keep-alive 連線，未傳入時由 ChatOpenAI 自行建立
+        self.llm = LLMFactory.get_card_agent_llm(http_async_client=http_async_client)
     
     async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """處理名片 OCR 請求"""
         image_data = input_data.get("image_data", "")
         image_url = input_data.get("image_url", "")
+        image_mime_type = input_data.get("image_mime_type") or "image/jpeg"
         session_id = input_data.get("session_id", "")
         
         if not image_data and not image_url:
@@ -31,7 +33,7 @@ class CardAgent(BaseAgent):
         
         try:
             # 分析名片
-            card_info = await self._analyze_business_card(image_data, image_url)
+            card_info = await self._analyze_business_card(image_data, image_url, image_mime_type)
             
             if card_info:
                 # 更新用戶資料
@@ -62,7 +64,9 @@ class CardAgent(BaseAgent):
                 metadata={"error": str(e)}
             )
     
-    async def _analyze_business_card(self, image_data: str, image_url: str) -> Optional[Dict[str, Any]]:
+    async def _analyze_business_card(
+        self, image_data: str, image_url: str, mime_type: str = "image/jpeg"
+    ) -> Optional[Dict[str, Any]]:
         """分析名片圖片"""
         try:
             # 構建圖片訊息
@@ -71,7 +75,7 @@ class CardAgent(BaseAgent):
                 image_content = {
                     "type": "image_url",
                     "image_url": {
-                        "url": f"data:image/jpeg;base64,{image_data}"
+                        "url": f"data:{mime_type};base64,{image_data}"
                     }
                 }
             elif image_url:
@@ -1,4 +1,4 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Union
 import base64
 import json
 import re
@@ -12,13 +12,14 @@ class VisionAgent(BaseAgent):
     視覺 Agent - 專門處理即時影像分析，特別是人物表情和情緒辨識。
     """
 
-    def __init__(self):
+    def __init__(self, http_async_client: Optional[Any] = None):
         super().__init__(
             name="VisionAgent",
             description="AI 視覺助理，能從影像中分析客戶的表情與情緒，提供即時互動反饋。"
         )
         # 假設 LLMFactory 能夠提供一個支援視覺的多模態模型
-        self.llm = LLMFactory.get_vision_agent_llm()
+        # 可傳入共用的 httpx.AsyncClient 以重用 keep-alive 連線，未傳入時由 ChatOpenAI 自行建立
+        self.llm = LLMFactory.get_vision_agent_llm(http_async_client=http_async_client)
 
     async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -26,6 +27,7 @@ class VisionAgent(BaseAgent):
         """
         image_data = input_data.get("image_data", "") # Base64 格式的圖片
         session_id = input_data.get("session_id", "")
+        mime_type = input_data.get("image_mime_type") or "image/jpeg"
 
         if not image_data or not session_id:
             return self.format_response(
@@ -35,7 +37,7 @@ class VisionAgent(BaseAgent):
 
         try:
             # 分析情緒
-            emotion_info = await self._analyze_emotion(image_data)
+            emotion_info = await self._analyze_emotion(image_data, mime_type)
 
             if emotion_info and emotion_info.get("emotion"):
                 # 將分析出的情緒更新到 Redis 的 user_profile 中
@@ -61,7 +63,18 @@ class VisionAgent(BaseAgent):
                 metadata={"error": str(e)}
             )
 
-    async def _analyze_emotion(self, image_data: str) -> Optional[Dict[str, Any]]:
+    @staticmethod
+    def _encode_image(image_data: Union[str, bytes]) -> str:
+        """
+        將圖片轉為 base64 字串；原始 bytes 只在組裝 LLM 請求時編碼一次。
+        """
+        if isinstance(image_data, (bytes, bytearray)):
+            return base64.b64encode(image_data).decode('utf-8')
+        return image_data
+
+    async def _analyze_emotion(
+        self, image_data: Union[str, bytes], mime_type: str = "image/jpeg"
+    ) -> Optional[Dict[str, Any]]:
         """
         使用多模態 LLM 分析單一影像幀中的情緒。
         """
@@ -71,7 +84,7 @@ class VisionAgent(BaseAgent):
             image_content = {
                 "type": "image_url",
                 "image_url": {
-                    "url": f"data:image/jpeg;base64,{image_data}"
+                    "url": f"data:{mime_type};base64,{self._encode_image(image_data)}"
                 }
             }
 
@@ -118,11 +131,13 @@ class VisionAgent(BaseAgent):
             print(f"情緒分析時發生錯誤: {e}")
             return None
 
-    async def analyze_emotion(self, image_data: str) -> Optional[Dict[str, Any]]:
+    async def analyze_emotion(
+        self, image_data: Union[str, bytes], mime_type: str = "image/jpeg"
+    ) -> Optional[Dict[str, Any]]:
         """
         公開的情緒分析方法，供外部調用。
         """
-        return await self._analyze_emotion(image_data)
+        return await self._analyze_emotion(image_data, mime_type)
 
     def get_system_prompt(self) -> str:
         """
@@ -163,7 +178,9 @@ class VisionAgent(BaseAgent):
 請務必只返回 JSON 物件，不要包含任何其他文字、解釋或 markdown 標籤。
 """
 
-    async def analyze_image_content(self, image_data: str, question: str) -> Optional[Dict[str, Any]]:
+    async def analyze_image_content(
+        self, image_data: str, question: str, mime_type: str = "image/jpeg"
+    ) -> Optional[Dict[str, Any]]:
         """
         分析圖片內容並回答特定問題（如顏色、服裝等）
         """
@@ -174,7 +191,7 @@ class VisionAgent(BaseAgent):
             image_content = {
                 "type": "image_url",
                 "image_url": {
-                    "url": f"data:image/jpeg;base64,{image_data}"
+                    "url": f"data:{mime_type};base64,{image_data}"
                 }
             }
 
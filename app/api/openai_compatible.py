@@ -1,8 +1,8 @@
 from typing import Dict, Any, AsyncGenerator
 from fastapi import Request, HTTPException
 from fastapi.responses import StreamingResponse
-import json
 import time
+import orjson
 import uuid
 from datetime import datetime
 
@@ -26,6 +26,17 @@ from app.core.error_handler import error_handler
 from app.core.tokenizer import get_token_counter
 
 
+# SSE 固定的前後綴，預先編碼成 bytes
+_SSE_PREFIX = b"data: "
+_SSE_SUFFIX = b"\n\n"
+_SSE_DONE = b"data: [DONE]\n\n"
+
+
+def _sse_event(payload: Dict[str, Any]) -> bytes:
+    """將一個 payload 編碼為 SSE 事件"""
+    return _SSE_PREFIX + orjson.dumps(payload) + _SSE_SUFFIX
+
+
 class OpenAICompatibleAPI:
     """OpenAI 相容 API 實現"""
     
@@ -124,22 +135,24 @@ class OpenAICompatibleAPI:
             prompt_tokens = self.token_counter.count_messages_tokens(request.messages)
             completion_tokens = self.token_counter.count_tokens(response_content)
             
-            # 構建回應
-            response = ChatCompletionResponse(
+            # 構建回應（欄位皆由本函式產生，使用 model_construct 略過重複驗證）
+            response = ChatCompletionResponse.model_construct(
                 id=request_id,
+                object="chat.completion",
                 created=int(time.time()),
                 model=request.model,
                 choices=[
-                    ChatCompletionChoice(
+                    ChatCompletionChoice.model_construct(
                         index=0,
-                        message=Message(
+                        message=Message.model_construct(
                             role=MessageRole.ASSISTANT,
-                            content=response_content
+                            content=response_content,
+                            name=None
                         ),
                         finish_reason="stop"
                     )
                 ],
-                usage=Usage(
+                usage=Usage.model_construct(
                     prompt_tokens=prompt_tokens,
                     completion_tokens=completion_tokens,
                     total_tokens=prompt_tokens + completion_tokens
@@ -159,6 +172,9 @@ class OpenAICompatibleAPI:
             
             return response
             
+        except HTTPException:
+            # 已是對外的錯誤回應（例如內容政策的 400），直接交給 FastAPI，不再包成 500
+            raise
         except Exception as e:
             logger.error(
                 "API 請求處理失敗",
@@ -231,8 +247,8 @@ class OpenAICompatibleAPI:
                         "工作流執行失敗",
                         "internal_error"
                     )
-                    yield f"data: {json.dumps(error_chunk)}\\n\\n"
-                    yield "data: [DONE]\\n\\n"
+                    yield _sse_event(error_chunk)
+                    yield _SSE_DONE
                     return
 
                 response_content = workflow_result.content
@@ -242,40 +258,28 @@ class OpenAICompatibleAPI:
                     updated_profile = workflow_result.metadata["updated_user_profile"]
                     memory_manager.save_user_profile(session_id, updated_profile)
                 
-                # 模擬流式輸出
+                # 模擬流式輸出（每個 chunk 只有 delta 不同，其餘欄位共用）
+                created = int(time.time())
+                
+                def _chunk(delta: Dict[str, Any], finish_reason=None) -> bytes:
+                    return _sse_event({
+                        "id": request_id,
+                        "object": "chat.completion.chunk",
+                        "created": created,
+                        "model": request.model,
+                        "choices": [
+                            {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                        ]
+                    })
+                
                 words = response_content.split()
+                last = len(words) - 1
                 for i, word in enumerate(words):
-                    chunk = ChatCompletionStreamResponse(
-                        id=request_id,
-                        created=int(time.time()),
-                        model=request.model,
-                        choices=[
-                            ChatCompletionStreamChoice(
-                                index=0,
-                                delta={"content": word + " " if i < len(words) - 1 else word},
-                                finish_reason=None
-                            )
-                        ]
-                    )
-                    
-                    yield f"data: {chunk.json()}\\n\\n"
+                    yield _chunk({"content": word + " " if i < last else word})
                 
                 # 結束標記
-                final_chunk = ChatCompletionStreamResponse(
-                    id=request_id,
-                    created=int(time.time()),
-                    model=request.model,
-                    choices=[
-                        ChatCompletionStreamChoice(
-                            index=0,
-                            delta={},
-                            finish_reason="stop"
-                        )
-                    ]
-                )
-                
-                yield f"data: {final_chunk.json()}\\n\\n"
-                yield "data: [DONE]\\n\\n"
+                yield _chunk({}, "stop")
+                yield _SSE_DONE
                 
             except Exception as e:
                 error_chunk = {
@@ -284,15 +288,15 @@ class OpenAICompatibleAPI:
                         "type": "internal_error"
                     }
                 }
-                yield f"data: {json.dumps(error_chunk)}\\n\\n"
+                yield _sse_event(error_chunk)
         
         return StreamingResponse(
             generate_stream(),
-            media_type="text/plain",
+            media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
                 "Connection": "keep-alive",
-                "Content-Type": "text/event-stream"
+                "X-Accel-Buffering": "no"
             }
         )
     
@@ -56,6 +56,7 @@ class Settings(BaseSettings):
     redis_url: str = "redis://localhost:6379"
     api_host: str = "0.0.0.0"
     api_port: int = 8000
+    cors_origins: str = "http://localhost:8501,http://localhost:7860"  # 以逗號分隔
     
     # 開發環境設定
     debug: bool = True
@@ -5,33 +5,35 @@
 import base64
 import io
 import logging
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, Optional, Tuple, Union
 from PIL import Image
 
 logger = logging.getLogger(__name__)
 
 async def process_user_request(
     message: str,
-    image: Optional[Any],
+    image: Optional[Union[str, bytes, Image.Image]],
     user_profile: Dict[str, Any],
     interaction_mode: str,
     session_id: str = "default_session",
     response_mode: str = "chat",
     max_tokens: Optional[int] = None,
-    temperature: Optional[float] = None
+    temperature: Optional[float] = None,
+    image_mime_type: Optional[str] = None
 ) -> Tuple[str, Dict[str, Any]]:
     """
     統一處理用戶請求的核心函數
     
     Args:
         message: 用戶文字訊息
-        image: 圖片 (PIL Image 或 base64 字串)
+        image: 圖片 (PIL Image、原始圖片 bytes 或 base64 字串)
         user_profile: 用戶檔案
         interaction_mode: 互動模式 (sales, support, consultation)
         session_id: 會話ID
         response_mode: 回應模式 (chat, virtual_human)
         max_tokens: 最大 token 數
         temperature: 溫度參數
+        image_mime_type: 圖片的 MIME 類型 (bytes 或 base64 字串時使用，預設 image/jpeg)
         
     Returns:
         Tuple[回應內容, 更新後的用戶檔案]
@@ -41,15 +43,20 @@ async def process_user_request(
     
     # 1. 處理圖片
     image_data = None
+    mime_type = image_mime_type or "image/jpeg"
     if image:
         try:
             if isinstance(image, str):
                 # 已經是 base64 字串
                 image_data = image
+            elif isinstance(image, (bytes, bytearray)):
+                # 原始圖片 bytes，只在送入工作流前編碼一次
+                image_data = base64.b64encode(image).decode('utf-8')
             else:
                 # PIL Image，需要轉換
                 buffer = io.BytesIO()
                 image.save(buffer, format='JPEG')
+                mime_type = "image/jpeg"
                 image_data = base64.b64encode(buffer.getvalue()).decode('utf-8')
             logger.info("圖片已成功轉換為 base64")
         except Exception as e:
@@ -63,6 +70,7 @@ async def process_user_request(
         "session_id": session_id,
         "has_image": has_image,
         "image_data": image_data,
+        "image_mime_type": mime_type,
         "user_profile": user_profile,
         "interaction_mode": interaction_mode,
         "response_mode": response_mode,
@@ -64,6 +64,7 @@ class VectorDatabase:
                     "title": doc.get("title", ""),
                     "category": doc.get("category", "general"),
                     "created_at": doc.get("created_at", ""),
+                    "content_hash": doc.get("content_hash", ""),
                 })
                 ids.append(doc.get("id", f"doc_{i}"))
             
@@ -85,6 +86,22 @@ class VectorDatabase:
             print(f"❌ 新增文檔失敗: {e}")
             return False
     
+    async def get_content_hashes(self, ids: List[str]) -> Dict[str, str]:
+        """獲取既有文檔的內容 hash，回傳 {id: content_hash}"""
+        try:
+            if not self.collection:
+                return {}
+            
+            results = self.collection.get(ids=ids, include=["metadatas"])
+            return {
+                doc_id: (metadata or {}).get("content_hash", "")
+                for doc_id, metadata in zip(results["ids"], results["metadatas"])
+            }
+            
+        except Exception as e:
+            print(f"❌ 查詢文檔失敗: {e}")
+            return {}
+    
     async def search_similar(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """搜索相似文檔"""
         try:
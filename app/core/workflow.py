@@ -22,6 +22,22 @@ except ImportError:
     HAS_LANGGRAPH = False
 
 
+# 路由規則常數，於載入時建立一次，每次路由決策不必重建
+_INTENT_TO_AGENT = {
+    "greeting": "chat_agent",
+    "product_inquiry": "rag_agent",
+    "appointment": "calendar_agent",
+    "card_processing": "card_agent",
+    "knowledge_query": "rag_agent",
+    "comparison": "rag_agent",
+    "complaint": "chat_agent",
+    "goodbye": "chat_agent"
+}
+_CARD_KEYWORDS = ("名片", "卡片", "聯絡", "資訊", "掃描", "識別", "上傳")
+_CHAT_KEYWORDS = ("你好", "哈囉", "hi", "hello", "謝謝", "再見", "問候", "聊天")
+_VISION_KEYWORDS = ("看", "視覺", "攝影機", "鏡頭", "表情", "情緒", "外觀", "穿", "顏色", "男生", "女生")
+
+
 class WorkflowState(Enum):
     """工作流狀態"""
     PENDING = "pending"
@@ -494,18 +510,7 @@ class LangGraphWorkflowManager:
         primary_intent = intent_analysis["primary_intent"]
         
         # 基於意圖的 Agent 選擇
-        intent_to_agent = {
-            "greeting": "chat_agent",
-            "product_inquiry": "rag_agent",
-            "appointment": "calendar_agent",
-            "card_processing": "card_agent",
-            "knowledge_query": "rag_agent",
-            "comparison": "rag_agent",
-            "complaint": "chat_agent",
-            "goodbye": "chat_agent"
-        }
-        
-        primary_agent = intent_to_agent.get(primary_intent, "chat_agent")
+        primary_agent = _INTENT_TO_AGENT.get(primary_intent, "chat_agent")
         
         if execution_mode == "single":
             return {
@@ -521,31 +526,30 @@ class LangGraphWorkflowManager:
         # 智能判斷圖片類型並添加相應 Agent
         if has_image:
             # 判斷是否為名片掃描還是攝影機影像
-            card_keywords = ["名片", "卡片", "聯絡", "資訊", "掃描", "識別", "上傳"]
-            has_card_keywords = any(keyword in user_input for keyword in card_keywords)
+            has_card_keywords = any(keyword in user_input for keyword in _CARD_KEYWORDS)
             
             # 對話關鍵字表示這是攝影機影像
-            chat_keywords = ["你好", "哈囉", "hi", "hello", "謝謝", "再見", "問候", "聊天"]
-            has_chat_keywords = any(keyword in user_input.lower() for keyword in chat_keywords)
+            lowered_input = user_input.lower()
+            has_chat_keywords = any(keyword in lowered_input for keyword in _CHAT_KEYWORDS)
+            text_length = len(user_input.strip())
             
             # 如果有名片關鍵字，或者純圖片上傳（很少文字），添加 card_agent
-            if has_card_keywords or (len(user_input.strip()) < 10 and not has_chat_keywords):
+            if has_card_keywords or (text_length < 10 and not has_chat_keywords):
                 if "card_agent" not in agents:
                     agents.append("card_agent")
                     logger.info(f"添加 card_agent 因為有名片關鍵字或純圖片上傳")
             
             # 如果有明確的對話意圖，添加 vision_agent 用於情緒分析
-            if has_chat_keywords or len(user_input.strip()) >= 10:
+            if has_chat_keywords or text_length >= 10:
                 if "vision_agent" not in agents:
                     agents.append("vision_agent")
                     logger.info(f"添加 vision_agent 因為有對話意圖")
         
         # 對於視覺相關的問題，添加 VisionAgent
-        vision_keywords = ["看", "視覺", "攝影機", "鏡頭", "表情", "情緒", "外觀", "穿", "顏色", "男生", "女生"]
-        if any(keyword in user_input for keyword in vision_keywords):
+        if any(keyword in user_input for keyword in _VISION_KEYWORDS):
             if "vision_agent" not in agents:
                 agents.append("vision_agent")
-                logger.info(f"添加 vision_agent 因為包含關鍵字: {[k for k in vision_keywords if k in user_input]}")
+                logger.info(f"添加 vision_agent 因為包含關鍵字: {[k for k in _VISION_KEYWORDS if k in user_input]}")
         
         if primary_intent == "comparison" and "rag_agent" not in agents:
             agents.append("rag_agent")
@@ -78,31 +78,34 @@ class LLMFactory:
         )
     
     @staticmethod
-    def get_calendar_agent_llm() -> BaseLanguageModel:
+    def get_calendar_agent_llm(**kwargs) -> BaseLanguageModel:
         """獲取行事曆 Agent 的 LLM"""
         return LLMFactory.create_openai_llm(
             api_key=settings.calendar_api_key,
             base_url=settings.calendar_base_url,
             model_name=settings.calendar_model_name,
-            temperature=0.1  # 極低溫度確保結構化任務的準確性
+            temperature=0.1,  # 極低溫度確保結構化任務的準確性
+            **kwargs
         )
     
     @staticmethod
-    def get_card_agent_llm() -> BaseLanguageModel:
+    def get_card_agent_llm(**kwargs) -> BaseLanguageModel:
         """獲取名片 Agent 的 LLM"""
         return LLMFactory.create_openai_llm(
             api_key=settings.card_api_key,
             base_url=settings.card_base_url,
             model_name=settings.card_model_name,
-            temperature=0.2  # 低溫度確保 OCR 準確性
+            temperature=0.2,  # 低溫度確保 OCR 準確性
+            **kwargs
         )
 
     @staticmethod
-    def get_vision_agent_llm() -> BaseLanguageModel:
+    def get_vision_agent_llm(**kwargs) -> BaseLanguageModel:
         """獲取視覺 Agent 的 LLM - 支援多模態輸入"""
         return LLMFactory.create_openai_llm(
             api_key=settings.vision_api_key,
             base_url=settings.vision_base_url,
             model_name=settings.vision_model_name,
-            temperature=0.3  # 較低溫度確保情緒識別的準確性
+            temperature=0.3,  # 較低溫度確保情緒識別的準確性
+            **kwargs
         )
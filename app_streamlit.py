@@ -1,12 +1,8 @@
 import streamlit as st
 import asyncio
-import cv2
-import numpy as np
-import base64
-import json
-import io
-from PIL import Image
+import orjson
 import threading
+import uuid
 import time
 from datetime import datetime
 import sys
@@ -14,8 +10,8 @@ import os
 import logging
 from typing import Dict, Any, Optional, List, Tuple
 from pathlib import Path
-import contextlib
-import gc
+from collections import deque
+from itertools import islice
 
 # 添加專案路徑
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -24,79 +20,19 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# 上下文管理器，確保資源正確清理
-@contextlib.asynccontextmanager
-async def safe_async_context():
-    """確保異步操作的資源正確清理"""
-    try:
-        yield
-    finally:
-        # 更積極的資源清理
-        try:
-            # 等待所有掛起的 gRPC 調用完成
-            await asyncio.sleep(0.2)
-            
-            # 強制進行垃圾回收，清理未完成的 gRPC 調用
-            gc.collect()
-            
-            # 再次等待，確保清理完成
-            await asyncio.sleep(0.1)
-        except Exception as cleanup_error:
-            logger.warning(f"資源清理過程中出現警告: {cleanup_error}")
-            # 不重新拋出異常，因為這只是清理過程的警告
+# 背景常駐 event loop（Streamlit 每次 rerun 都會重新執行腳本，因此以 cache_resource 保持單一實例）
+@st.cache_resource
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """建立並啟動整個 process 共用的背景 event loop"""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="streamlit-async-loop", daemon=True).start()
+    return loop
 
 # 安全的異步運行函數
 def safe_run_async(coro):
-    """安全地運行異步函數，避免 event loop 衝突"""
+    """將協程提交到背景 event loop 執行並等待結果，避免 event loop 衝突"""
     try:
-        # 嘗試獲取現有的 event loop
-        loop = asyncio.get_running_loop()
-        if loop.is_running():
-            # 如果 loop 正在運行，創建一個新的線程來運行協程
-            import concurrent.futures
-            import threading
-            
-            def run_coro():
-                # 在新線程中創建新的 event loop
-                new_loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(new_loop)
-                try:
-                    # 包裝協程以確保資源清理
-                    async def wrapped_coro():
-                        async with safe_async_context():
-                            return await coro
-                    return new_loop.run_until_complete(wrapped_coro())
-                finally:
-                    new_loop.close()
-            
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future = executor.submit(run_coro)
-                return future.result(timeout=60)  # 設置超時
-        else:
-            return asyncio.run(coro)
-    except RuntimeError as e:
-        if "cannot be called from a running event loop" in str(e):
-            # 如果是 event loop 衝突，使用線程池執行
-            import concurrent.futures
-            import threading
-            
-            def run_coro():
-                new_loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(new_loop)
-                try:
-                    async def wrapped_coro():
-                        async with safe_async_context():
-                            return await coro
-                    return new_loop.run_until_complete(wrapped_coro())
-                finally:
-                    new_loop.close()
-            
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future = executor.submit(run_coro)
-                return future.result(timeout=60)
-        else:
-            # 其他 RuntimeError，直接運行
-            return asyncio.run(coro)
+        return asyncio.run_coroutine_threadsafe(coro, get_background_loop()).result()
     except Exception as e:
         logger.error(f"safe_run_async 執行失敗: {e}")
         raise
@@ -105,8 +41,6 @@ def safe_run_async(coro):
 try:
     from app.core.workflow import workflow_manager
     from app.core.ui_handler import process_user_request  # 使用統一處理函數
-    from app.agents.vision_agent import VisionAgent
-    from app.models.llm_factory import LLMFactory
     from app.config import settings
     logger.info("所有模組載入成功")
 except ImportError as e:
@@ -114,6 +48,92 @@ except ImportError as e:
     st.error(f"系統載入失敗: {e}")
     st.stop()
 
+@st.cache_resource
+def get_vision_agent():
+    """整個 process 共用同一個 VisionAgent，避免每個 session 重建 LLM client"""
+    from app.agents.vision_agent import VisionAgent  # 延遲載入，首次使用時才初始化
+    return VisionAgent()
+
+# 對話區每次 rerun 最多直接渲染的訊息輪數
+CHAT_HISTORY_WINDOW = 50
+# session_state 中最多保留的對話輪數，更舊的對話寫入封存檔
+CHAT_HISTORY_MAXLEN = 200
+CHAT_ARCHIVE_DIR = Path("logs") / "chat_archive"
+GREETING_MESSAGE = "您好！我是 AI 銷售助理，很高興為您服務。您可以詢問產品、安排會議，或上傳名片讓我更認識您！"
+
+def new_chat_history() -> deque:
+    """建立新的對話紀錄，AI 主動打招呼"""
+    return deque([("", GREETING_MESSAGE)], maxlen=CHAT_HISTORY_MAXLEN)
+
+def _chat_turn_line(user_msg: str, assistant_msg: str) -> bytes:
+    return orjson.dumps({"user": user_msg, "assistant": assistant_msg}) + b"\n"
+
+def append_chat_turn(user_msg: str, assistant_msg: str):
+    """新增一輪對話；超出上限時先把最舊的一輪附加到封存檔"""
+    history = st.session_state.chat_history
+    if len(history) == history.maxlen:
+        CHAT_ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(st.session_state.chat_archive_path, "ab") as f:
+            f.write(_chat_turn_line(*history[0]))
+    history.append((user_msg, assistant_msg))
+
+def reset_chat_history():
+    """清除對話紀錄與封存檔"""
+    st.session_state.chat_archive_path.unlink(missing_ok=True)
+    st.session_state.chat_history = new_chat_history()
+
+def render_chat_turn(user_msg: str, assistant_msg: str):
+    """以 st.chat_message 顯示一輪對話"""
+    if user_msg:
+        with st.chat_message("user"):
+            st.write(user_msg)
+    if assistant_msg:
+        with st.chat_message("assistant"):
+            st.write(assistant_msg)
+
+# 情緒歷史最多保留的筆數
+EMOTION_HISTORY_MAXLEN = 1000
+
+def format_timestamp(timestamp: float) -> str:
+    """情緒紀錄以 time.time() 儲存，顯示或匯出時才格式化"""
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+def iter_export_lines():
+    """逐行產生 JSONL 匯出內容：第一行為 session 資訊，其後每行一輪對話"""
+    yield orjson.dumps({
+        "timestamp": datetime.now().isoformat(),
+        "user_profile": st.session_state.user_profile,
+        "emotion_history": [
+            {"timestamp": format_timestamp(record["timestamp"]), "emotion": record["emotion"]}
+            for record in st.session_state.emotion_history
+        ]
+    }, option=orjson.OPT_NON_STR_KEYS) + b"\n"
+    archive_path = st.session_state.chat_archive_path
+    if archive_path.exists():
+        with open(archive_path, "rb") as f:
+            yield from f
+    for user_msg, assistant_msg in st.session_state.chat_history:
+        yield _chat_turn_line(user_msg, assistant_msg)
+
+@st.fragment
+def render_export_button():
+    """匯出對話按鈕；以 fragment 隔離，序列化只在此區塊重跑時發生"""
+    if st.button("📋 匯出對話"):
+        if st.session_state.chat_history:
+            st.download_button(
+                label="下載 JSONL",
+                data=b"".join(iter_export_lines()),
+                file_name=f"chat_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl",
+                mime="application/jsonl"
+            )
+
+STATIC_DIR = Path(__file__).parent / "app" / "static"
+
+@st.cache_data
+def load_css() -> str:
+    """讀取自訂 CSS，每個 process 只讀一次檔案"""
+    return (STATIC_DIR / "streamlit.css").read_text(encoding="utf-8")
+
 # 設定頁面配置
 st.set_page_config(
     page_title="AI Sales 智能銷售助手",
@@ -123,66 +143,16 @@ st.set_page_config(
 )
 
 # 自訂 CSS
-st.markdown("""
-<style>
-    .main-header {
-        background: linear-gradient(90deg, #667eea 0%, #764ba2 100%);
-        padding: 1rem;
-        border-radius: 10px;
-        color: white;
-        text-align: center;
-        margin-bottom: 2rem;
-    }
-    .chat-container {
-        max-height: 500px;
-        overflow-y: auto;
-        padding: 1rem;
-        background-color: #f8f9fa;
-        border-radius: 10px;
-        margin-bottom: 1rem;
-    }
-    .user-message {
-        background-color: #e3f2fd;
-        padding: 0.5rem 1rem;
-        margin: 0.5rem 0;
-        border-radius: 15px;
-        text-align: right;
-    }
-    .assistant-message {
-        background-color: #f5f5f5;
-        padding: 0.5rem 1rem;
-        margin: 0.5rem 0;
-        border-radius: 15px;
-        text-align: left;
-    }
-    .emotion-display {
-        background: linear-gradient(45deg, #ff6b6b, #4ecdc4);
-        padding: 1rem;
-        border-radius: 10px;
-        color: white;
-        text-align: center;
-        margin: 1rem 0;
-    }
-    .camera-container {
-        border: 2px solid #ddd;
-        border-radius: 10px;
-        padding: 1rem;
-        text-align: center;
-    }
-</style>
-""", unsafe_allow_html=True)
+st.markdown(f"<style>{load_css()}</style>", unsafe_allow_html=True)
 
 # 初始化 session state
 if 'chat_history' not in st.session_state:
-    st.session_state.chat_history = []
-    # AI 主動打招呼
-    greeting_message = "您好！我是 AI 銷售助理，很高興為您服務。您可以詢問產品、安排會議，或上傳名片讓我更認識您！"
-    st.session_state.chat_history.append(("", greeting_message))
+    st.session_state.chat_history = new_chat_history()
+if 'chat_archive_path' not in st.session_state:
+    st.session_state.chat_archive_path = CHAT_ARCHIVE_DIR / f"{uuid.uuid4().hex}.jsonl"
     
 if 'user_profile' not in st.session_state:
     st.session_state.user_profile = {}
-if 'vision_agent' not in st.session_state:
-    st.session_state.vision_agent = VisionAgent()
 if 'current_emotion' not in st.session_state:
     st.session_state.current_emotion = None
 if 'camera_active' not in st.session_state:
@@ -190,7 +160,7 @@ if 'camera_active' not in st.session_state:
 if 'current_camera_image' not in st.session_state:
     st.session_state.current_camera_image = None
 if 'emotion_history' not in st.session_state:
-    st.session_state.emotion_history = []
+    st.session_state.emotion_history = deque(maxlen=EMOTION_HISTORY_MAXLEN)
 
 # 主標題
 st.markdown("""
@@ -242,7 +212,7 @@ with st.sidebar:
         st.success("✅ 攝影機已啟動")
         # 顯示攝影機圖片狀態
         if 'current_camera_image' in st.session_state and st.session_state.current_camera_image:
-            st.info(f"📸 攝影機圖片已保存 ({len(st.session_state.current_camera_image)} 字元)")
+            st.info(f"📸 攝影機圖片已保存 ({len(st.session_state.current_camera_image)} bytes)")
         else:
             st.warning("📸 尚未拍照")
     else:
@@ -273,92 +243,77 @@ col1, col2 = st.columns([2, 1])
 with col1:
     st.header("💬 對話區域")
     
-    # 聊天歷史顯示
+    # 聊天歷史顯示：只具現化最近的訊息，較舊的收在 expander 中
+    # 放在輸入框上方的容器內，之後新增的對話也畫在這裡，不會出現在輸入框下方
     chat_container = st.container()
+    chat_history = st.session_state.chat_history
+    window_start = max(0, len(chat_history) - CHAT_HISTORY_WINDOW)
     with chat_container:
-        for i, (user_msg, assistant_msg) in enumerate(st.session_state.chat_history):
-            if user_msg:
-                st.markdown(f'<div class="user-message">👤 {user_msg}</div>', unsafe_allow_html=True)
-            if assistant_msg:
-                st.markdown(f'<div class="assistant-message">🤖 {assistant_msg}</div>', unsafe_allow_html=True)
+        if window_start:
+            with st.expander(f"較早的訊息 ({window_start})"):
+                for user_msg, assistant_msg in islice(chat_history, window_start):
+                    render_chat_turn(user_msg, assistant_msg)
+        for user_msg, assistant_msg in islice(chat_history, window_start, None):
+            render_chat_turn(user_msg, assistant_msg)
     
     # 輸入區域
-    st.subheader("✍️ 輸入訊息")
+    user_input = st.chat_input("請輸入您的問題...")
     
-    # 使用表單來處理輸入
-    with st.form("chat_form", clear_on_submit=True):
-        user_input = st.text_input("請輸入您的問題...", key="user_message")
-        submitted = st.form_submit_button("💬 發送訊息", type="primary")
-        
-        if submitted and user_input:
-            # 處理用戶訊息
-            with st.spinner("AI 正在思考..."):
-                try:
-                    # 檢查是否有攝影機圖片
-                    camera_image = None
-                    if st.session_state.camera_active and 'current_camera_image' in st.session_state:
-                        camera_image = st.session_state.current_camera_image
-                        logger.info(f"使用攝影機圖片，長度: {len(camera_image) if camera_image else 0}")
-                    
-                    # 添加更多debug信息
-                    logger.info(f"攝影機狀態: {st.session_state.camera_active}")
-                    logger.info(f"攝影機圖片存在: {'current_camera_image' in st.session_state}")
-                    logger.info(f"攝影機圖片內容: {camera_image is not None}")
-                    
-                    # 確定模式參數
-                    mode = "virtual_human" if "虛擬人" in response_mode else "chat"
-                    
-                    # 使用統一的核心處理函數
-                    response_text, updated_profile = safe_run_async(process_user_request(
-                        message=user_input,
-                        image=camera_image,
-                        user_profile=st.session_state.user_profile,
-                        interaction_mode=interaction_mode,
-                        session_id="streamlit_session",
-                        response_mode=mode,
-                        max_tokens=max_tokens,
-                        temperature=temperature
-                    ))
-                    
-                    # 更新聊天歷史
-                    st.session_state.chat_history.append((user_input, response_text))
-                    
-                    # 更新用戶檔案
+    if user_input:
+        # 處理用戶訊息
+        with st.spinner("AI 正在思考..."):
+            try:
+                # 檢查是否有攝影機圖片
+                camera_image = None
+                if st.session_state.camera_active and 'current_camera_image' in st.session_state:
+                    camera_image = st.session_state.current_camera_image
+                    logger.info(f"使用攝影機圖片，長度: {len(camera_image) if camera_image else 0}")
+                
+                # 添加更多debug信息
+                logger.info(f"攝影機狀態: {st.session_state.camera_active}")
+                logger.info(f"攝影機圖片存在: {'current_camera_image' in st.session_state}")
+                logger.info(f"攝影機圖片內容: {camera_image is not None}")
+                
+                # 確定模式參數
+                mode = "virtual_human" if "虛擬人" in response_mode else "chat"
+                
+                # 使用統一的核心處理函數
+                response_text, updated_profile = safe_run_async(process_user_request(
+                    message=user_input,
+                    image=camera_image,
+                    user_profile=st.session_state.user_profile,
+                    interaction_mode=interaction_mode,
+                    session_id="streamlit_session",
+                    response_mode=mode,
+                    max_tokens=max_tokens,
+                    temperature=temperature
+                ))
+                
+                # 更新聊天歷史並直接顯示新的對話，不需整頁重跑
+                append_chat_turn(user_input, response_text)
+                with chat_container:
+                    render_chat_turn(user_input, response_text)
+                
+                # 用戶檔案有變動時才重跑，讓側邊欄同步更新
+                if updated_profile != st.session_state.user_profile:
                     st.session_state.user_profile = updated_profile
-                    
                     st.rerun()
-                    
-                except Exception as e:
-                    st.error(f"處理訊息時出錯: {e}")
-                    logger.error(f"Message processing error: {e}")
+                
+            except Exception as e:
+                st.error(f"處理訊息時出錯: {e}")
+                logger.error(f"Message processing error: {e}")
     
     # 按鈕區域
     col_btn1, col_btn2 = st.columns(2)
     
     with col_btn1:
         if st.button("🗑️ 清除對話"):
-            st.session_state.chat_history = []
+            reset_chat_history()
             st.session_state.user_profile = {}
-            # 重新添加打招呼訊息
-            greeting_message = "您好！我是 AI 銷售助理，很高興為您服務。您可以詢問產品、安排會議，或上傳名片讓我更認識您！"
-            st.session_state.chat_history.append(("", greeting_message))
             st.rerun()
     
     with col_btn2:
-        if st.button("📋 匯出對話"):
-            if st.session_state.chat_history:
-                export_data = {
-                    "timestamp": datetime.now().isoformat(),
-                    "chat_history": st.session_state.chat_history,
-                    "user_profile": st.session_state.user_profile,
-                    "emotion_history": st.session_state.emotion_history
-                }
-                st.download_button(
-                    label="下載 JSON",
-                    data=json.dumps(export_data, ensure_ascii=False, indent=2),
-                    file_name=f"chat_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                    mime="application/json"
-                )
+        render_export_button()
 
 with col2:
     st.header("👁️ 視覺分析")
@@ -394,9 +349,9 @@ with col2:
     )
     
     if uploaded_file is not None:
-        # 顯示上傳的圖片
-        image = Image.open(uploaded_file)
-        st.image(image, caption="上傳的圖片", use_column_width=True)
+        # 顯示上傳的圖片（直接使用原始 bytes，不需先解碼）
+        image_bytes = uploaded_file.getvalue()
+        st.image(image_bytes, caption="上傳的圖片", use_column_width=True)
         
         # 處理圖片
         if st.button("🔍 分析圖片"):
@@ -408,7 +363,8 @@ with col2:
                     # 使用統一的核心處理函數
                     response_text, updated_profile = safe_run_async(process_user_request(
                         message="",
-                        image=image,  # 直接傳遞 PIL Image
+                        image=image_bytes,  # 直接傳遞原始圖片 bytes
+                        image_mime_type=uploaded_file.type,  # PNG 等非 JPEG 格式需帶上實際類型
                         user_profile=st.session_state.user_profile,
                         interaction_mode=interaction_mode,
                         session_id="streamlit_session",
@@ -418,7 +374,7 @@ with col2:
                     ))
                     
                     # 更新聊天歷史
-                    st.session_state.chat_history.append(("(圖片分析)", response_text))
+                    append_chat_turn("(圖片分析)", response_text)
                     
                     # 更新用戶檔案
                     st.session_state.user_profile = updated_profile
@@ -430,6 +386,17 @@ with col2:
                     st.error(f"圖片分析失敗: {e}")
                     logger.error(f"Image analysis error: {e}")
 
+class EmotionAnalysisFailed(Exception):
+    """情緒分析未取得結果"""
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def analyze_frame_emotion(image_bytes: bytes) -> Dict[str, Any]:
+    """以畫面內容為鍵快取情緒分析結果；失敗時拋出例外，不快取失敗結果，下次 rerun 會重試"""
+    result = safe_run_async(get_vision_agent().analyze_emotion(image_bytes))
+    if not result:
+        raise EmotionAnalysisFailed()
+    return result
+
 # 攝影機處理函數
 def process_camera():
     """處理攝影機畫面和情緒分析"""
@@ -441,45 +408,41 @@ def process_camera():
         camera_input = st.camera_input("攝影機畫面", key="camera")
         
         if camera_input is not None:
-            # 轉換圖片格式
-            image = Image.open(camera_input)
-            
-            # 儲存攝影機圖片供聊天系統使用
-            buffered = io.BytesIO()
-            image.save(buffered, format="PNG")
-            img_str = base64.b64encode(buffered.getvalue()).decode()
-            st.session_state.current_camera_image = img_str
-            logger.info(f"攝影機圖片已保存，長度: {len(img_str)}")
+            # 直接保存原始圖片 bytes，base64 編碼延後到送出給 LLM 時才進行
+            image_bytes = camera_input.getvalue()
+            is_new_frame = image_bytes != st.session_state.current_camera_image
+            st.session_state.current_camera_image = image_bytes
+            if is_new_frame:
+                logger.info(f"攝影機圖片已保存，大小: {len(image_bytes)} bytes")
             
             # 進行情緒分析
             try:
-                # 使用 VisionAgent 分析情緒
-                emotion_result = safe_run_async(
-                    st.session_state.vision_agent.analyze_emotion(img_str)
-                )
+                # 同一張畫面的結果會被快取，其他元件觸發的 rerun 不會重複呼叫 LLM
+                emotion_result = analyze_frame_emotion(image_bytes)
                 
-                logger.info(f"情緒分析結果: {emotion_result}")
+                if is_new_frame:
+                    logger.info(f"情緒分析結果: {emotion_result}")
                 
-                if emotion_result:
-                    st.session_state.current_emotion = emotion_result
+                st.session_state.current_emotion = emotion_result
+                if is_new_frame:
                     st.session_state.emotion_history.append({
-                        "timestamp": datetime.now().isoformat(),
+                        "timestamp": time.time(),
                         "emotion": emotion_result
                     })
-                    
-                    # 顯示情緒分析結果
-                    with emotion_placeholder.container():
-                        emotion_data = emotion_result
-                        st.markdown(f"""
-                        <div class="emotion-display">
-                            <h3>當前情緒: {emotion_data.get('emotion', 'Unknown')}</h3>
-                            <p>信心度: {emotion_data.get('confidence', 0):.2f}</p>
-                            <p>建議: {emotion_data.get('suggestion', '')}</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-                else:
-                    st.warning("未能分析出情緒")
+                
+                # 顯示情緒分析結果
+                with emotion_placeholder.container():
+                    emotion_data = emotion_result
+                    st.markdown(f"""
+                    <div class="emotion-display">
+                        <h3>當前情緒: {emotion_data.get('emotion', 'Unknown')}</h3>
+                        <p>信心度: {emotion_data.get('confidence', 0):.2f}</p>
+                        <p>建議: {emotion_data.get('suggestion', '')}</p>
+                    </div>
+                    """, unsafe_allow_html=True)
                         
+            except EmotionAnalysisFailed:
+                st.warning("未能分析出情緒")
             except Exception as e:
                 logger.error(f"Emotion analysis error: {e}")
                 st.error(f"情緒分析失敗: {e}")
@@ -496,8 +459,9 @@ if st.session_state.camera_active and vision_enabled:
 # 情緒歷史
 if st.session_state.emotion_history:
     with st.expander("📊 情緒歷史"):
-        for record in st.session_state.emotion_history[-10:]:  # 顯示最近10筆
-            st.write(f"**{record['timestamp']}**: {record['emotion'].get('emotion', 'Unknown')} ({record['emotion'].get('confidence', 0):.2f})")
+        recent_records = list(islice(reversed(st.session_state.emotion_history), 10))  # 顯示最近10筆
+        for record in reversed(recent_records):
+            st.write(f"**{format_timestamp(record['timestamp'])}**: {record['emotion'].get('emotion', 'Unknown')} ({record['emotion'].get('confidence', 0):.2f})")
 
 # 頁腳
 st.markdown("---")
@@ -4,10 +4,8 @@
 """
 
 import asyncio
-import schedule
-import time
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
 from app.core.logger import logger
 from process_pdfs import pdf_processor
 
@@ -18,6 +16,8 @@ class DocumentProcessingService:
     def __init__(self):
         self.is_running = False
         self.last_check = None
+        self.check_interval = timedelta(hours=1)
+        self._tasks = set()
     
     async def run_processing(self):
         """執行文檔處理"""
@@ -45,25 +45,36 @@ class DocumentProcessingService:
         finally:
             self.is_running = False
     
-    def start_scheduler(self):
+    def _spawn(self, coro):
+        """在目前的 event loop 背景執行任務，並保留參照避免被回收"""
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def run_scheduler(self):
         """啟動排程器"""
-        # 每小時檢查一次新文檔
-        schedule.every().hour.do(
-            lambda: asyncio.create_task(self.run_processing())
-        )
-        
-        # 每天午夜重新處理所有文檔
-        schedule.every().day.at("00:00").do(
-            lambda: asyncio.create_task(pdf_processor.reprocess_all())
-        )
+        # 每小時檢查一次新文檔，每天午夜重新處理所有文檔
+        next_check = datetime.now() + self.check_interval
+        next_reprocess = datetime.combine(datetime.now().date() + timedelta(days=1), datetime.min.time())
         
         logger.info("文檔處理排程器已啟動")
         logger.info("- 每小時檢查新文檔")
         logger.info("- 每天午夜重新處理所有文檔")
         
         while True:
-            schedule.run_pending()
-            time.sleep(60)  # 每分鐘檢查一次排程
+            now = datetime.now()
+            
+            if now >= next_check:
+                self._spawn(self.run_processing())
+                next_check = now + self.check_interval
+            
+            if now >= next_reprocess:
+                self._spawn(pdf_processor.reprocess_all())
+                next_reprocess += timedelta(days=1)
+            
+            # 直接睡到下一個排程時間，不需每分鐘輪詢
+            delay = (min(next_check, next_reprocess) - datetime.now()).total_seconds()
+            await asyncio.sleep(max(0.0, delay))
 
 
 # 創建服務實例
@@ -80,7 +91,7 @@ async def main():
     
     # 啟動排程器
     print("🔄 啟動定期處理服務...")
-    document_service.start_scheduler()
+    await document_service.run_scheduler()
 
 
 if __name__ == "__main__":
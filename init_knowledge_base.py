@@ -4,6 +4,7 @@
 """
 
 import asyncio
+import hashlib
 from app.core.vector_db import vector_db
 
 
@@ -95,11 +96,27 @@ async def init_knowledge_base():
         }
     ]
     
-    # 新增文檔到向量資料庫
-    success = await vector_db.add_documents(documents)
+    # 以內容 hash 比對既有文檔，只對新增或內容變更的文檔生成嵌入向量
+    for doc in documents:
+        doc["content_hash"] = hashlib.sha256(doc["content"].encode("utf-8")).hexdigest()
+    
+    existing_hashes = await vector_db.get_content_hashes([doc["id"] for doc in documents])
+    changed_documents = [doc for doc in documents if existing_hashes.get(doc["id"]) != doc["content_hash"]]
+    
+    if changed_documents:
+        # 內容變更的文檔先刪除舊版本
+        stale_ids = [doc["id"] for doc in changed_documents if doc["id"] in existing_hashes]
+        if stale_ids:
+            await vector_db.delete_documents(stale_ids)
+        
+        # 新增文檔到向量資料庫（所有文檔的嵌入向量以單次批次請求生成）
+        success = await vector_db.add_documents(changed_documents)
+    else:
+        print("ℹ️ 所有知識文檔皆已是最新，略過嵌入")
+        success = True
     
     if success:
-        print(f"✅ 成功初始化 {len(documents)} 個知識文檔")
+        print(f"✅ 成功初始化 {len(documents)} 個知識文檔（更新 {len(changed_documents)} 個）")
         
         # 顯示集合資訊
         info = vector_db.get_collection_info()
@@ -109,8 +126,12 @@ async def init_knowledge_base():
         print("\\n🔍 測試搜索功能...")
         test_queries = ["產品功能", "價格方案", "技術支援"]
         
-        for query in test_queries:
-            results = await vector_db.search_similar(query, top_k=2)
+        # 各查詢互不相依，同時送出以節省往返時間
+        all_results = await asyncio.gather(
+            *(vector_db.search_similar(query, top_k=2) for query in test_queries)
+        )
+        
+        for query, results in zip(test_queries, all_results):
             print(f"查詢 '{query}' 找到 {len(results)} 個相關文檔")
             for i, result in enumerate(results[:1], 1):
                 print(f"  {i}. {result.get('metadata', {}).get('title', 'Unknown')} (相似度: {result.get('score', 0):.2f})")
@@ -134,15 +155,17 @@ async def test_rag_functionality():
         "支援什麼樣的技術服務？"
     ]
     
-    for question in test_questions:
-        print(f"\\n❓ 問題: {question}")
-        
-        input_data = {
+    # 各問題互不相依，同時送出
+    responses = await asyncio.gather(*(
+        rag_agent.process({
             "user_input": question,
             "session_id": "test_session",
-        }
-        
-        response = await rag_agent.process(input_data)
+        })
+        for question in test_questions
+    ))
+    
+    for question, response in zip(test_questions, responses):
+        print(f"\\n❓ 問題: {question}")
         print(f"💬 回答: {response['content'][:100]}...")
 
 
@@ -1,8 +1,16 @@
-from fastapi import FastAPI, HTTPException
+import os
+import hashlib
+from pathlib import Path
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, Response
 from fastapi.staticfiles import StaticFiles # 新增這行
 from contextlib import asynccontextmanager
 from datetime import datetime
+from functools import lru_cache
+import time
+import orjson
 
 from app.api.openai_compatible import api
 from app.api.models import (
@@ -97,6 +105,7 @@ app = FastAPI(
     """,
     version="2.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     contact={
         "name": "AI Sales Team",
         "email": "support@c360company.com"
@@ -107,15 +116,35 @@ app = FastAPI(
     }
 )
 
-# 設置 CORS
+# 設置 CORS（明確列出來源，帶 credentials 時不可使用 "*"）
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=[origin.strip() for origin in settings.cors_origins.split(",") if origin.strip()],
     allow_credentials=True,
-    allow_methods=["*"],
+    allow_methods=["GET", "POST", "OPTIONS"],
     allow_headers=["*"],
 )
 
+# 壓縮大於 1KB 的回應（Starlette 0.46 起會略過 text/event-stream，SSE 不會被緩衝）
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+# vision.js 啟動時載入記憶體，以內容 hash 作為 ETag（需在 /static 掛載之前註冊才會優先匹配）
+_VISION_JS = Path("app/static/vision.js").read_bytes()
+_VISION_JS_ETAG = f'"{hashlib.blake2b(_VISION_JS, digest_size=16).hexdigest()}"'
+_VISION_JS_HEADERS = {
+    "Cache-Control": "public, max-age=3600",
+    "ETag": _VISION_JS_ETAG,
+}
+
+
+@app.get("/static/vision.js", include_in_schema=False)
+async def vision_js(request: Request):
+    """提供 vision.js（網址未帶版本，使用 ETag 驗證而非 immutable）"""
+    if request.headers.get("if-none-match") == _VISION_JS_ETAG:
+        return Response(status_code=304, headers=_VISION_JS_HEADERS)
+    return Response(_VISION_JS, media_type="application/javascript", headers=_VISION_JS_HEADERS)
+
+
 # 掛載靜態檔案目錄，讓前端可以存取 vision.js
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
@@ -125,6 +154,33 @@ app.include_router(api.router, prefix="/v1")
 # 掛載視覺分析的 WebSocket 路由
 app.include_router(vision_router.router, prefix="/vision", tags=["Vision"])
 
+# 內容固定的回應，啟動時序列化一次
+_ROOT_BYTES = orjson.dumps({
+    "message": "AI Sales Multi-Agent API",
+    "version": "2.0.0",
+    "docs": "/docs",
+    "openapi": "/openapi.json",
+    "ui_links": {
+        "streamlit": "http://localhost:8501",
+        "gradio": "http://localhost:7860"
+    }
+})
+_MODELS_BYTES = orjson.dumps(api.get_models().model_dump())
+_HEALTH_BASE = {
+    "status": "healthy",
+    "version": "2.0.0",
+    "components": {
+        "api": "running",
+        "agents": "ready"
+    }
+}
+
+
+@lru_cache(maxsize=1)
+def _iso_timestamp(second: int) -> str:
+    """健康檢查的時間戳記精確到秒，同一秒內的請求共用同一個 ISO 8601 字串"""
+    return datetime.fromtimestamp(second).isoformat()
+
 
 @app.get(
     "/",
@@ -145,16 +201,7 @@ app.include_router(vision_router.router, prefix="/vision", tags=["Vision"])
 )
 async def root():
     """根路徑"""
-    return {
-        "message": "AI Sales Multi-Agent API",
-        "version": "2.0.0",
-        "docs": "/docs",
-        "openapi": "/openapi.json",
-        "ui_links": {
-            "streamlit": "http://localhost:8501",
-            "gradio": "http://localhost:7860"
-        }
-    }
+    return Response(_ROOT_BYTES, media_type="application/json")
 
 
 @app.get(
@@ -175,15 +222,7 @@ async def root():
 )
 async def health_check():
     """健康檢查"""
-    return {
-        "status": "healthy", 
-        "timestamp": datetime.now().isoformat(),
-        "version": "2.0.0",
-        "components": {
-            "api": "running",
-            "agents": "ready"
-        }
-    }
+    return {**_HEALTH_BASE, "timestamp": _iso_timestamp(int(time.time()))}
 
 
 # OpenAI 相容端點
@@ -229,13 +268,13 @@ async def health_check():
 )
 async def chat_completions(request: ChatCompletionRequest):
     """聊天完成端點"""
-    try:
-        if request.stream:
-            return await api.chat_completions_stream(request)
-        else:
-            return await api.chat_completions(request)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    # 錯誤由 API 層轉成對應狀態碼的 HTTPException，不在此統一改寫成 500
+    if request.stream:
+        return await api.chat_completions_stream(request)
+    
+    # 回應已由 model_construct 建立，直接輸出以免 FastAPI 依 response_model 再驗證一次
+    response = await api.chat_completions(request)
+    return ORJSONResponse(response.model_dump())
 
 
 @app.get(
@@ -267,7 +306,7 @@ async def chat_completions(request: ChatCompletionRequest):
 )
 async def list_models():
     """列出可用模型"""
-    return api.get_models()
+    return Response(_MODELS_BYTES, media_type="application/json")
 
 
 @app.post(
@@ -279,7 +318,7 @@ async def list_models():
 )
 async def list_models_post():
     """列出可用模型 (POST 方法)"""
-    return api.get_models()
+    return Response(_MODELS_BYTES, media_type="application/json")
 
 
 if __name__ == "__main__":
@@ -289,6 +328,9 @@ if __name__ == "__main__":
         "main:app",
         host=settings.api_host,
         port=settings.api_port,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
         reload=settings.debug,
         log_level=settings.log_level.lower()
     )
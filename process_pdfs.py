@@ -3,27 +3,49 @@ PDF 文檔處理和向量化腳本
 """
 
 import os
+import re
+import json
 import asyncio
-from typing import List, Dict, Any
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Iterator
 from pathlib import Path
 import hashlib
 from datetime import datetime
 
-try:
-    import PyPDF2
-    HAS_PYPDF2 = True
-except ImportError:
-    HAS_PYPDF2 = False
-
-try:
-    import fitz  # PyMuPDF
-    HAS_PYMUPDF = True
-except ImportError:
-    HAS_PYMUPDF = False
+import fitz  # PyMuPDF
 
 from app.core.vector_db import vector_db
 from app.core.logger import logger
 
+# 清理文字用：刪除非空白類的控制字元（\t\n\v\f\r 與 \x1c-\x1f 交給空白正規化處理）
+_CONTROL_CHARS = dict.fromkeys([*range(0x00, 0x09), *range(0x0E, 0x1C)])
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# 檔案名稱關鍵字對應的文檔類別（依序比對，先符合者優先）
+CATEGORY_KEYWORDS = {
+    "product": ['product', '產品', 'feature', '功能'],
+    "pricing": ['price', '價格', 'pricing', '定價'],
+    "manual": ['manual', '手冊', 'guide', '指南'],
+    "faq": ['faq', '常見問題', 'qa'],
+}
+
+
+def _read_pages(doc, start: int, end: int) -> str:
+    """提取已開啟文檔中指定頁碼範圍的文字"""
+    parts = []
+    
+    for page_num in range(start, end):
+        page = doc.load_page(page_num)
+        parts.append(page.get_text("text", sort=False))
+    
+    return "".join(parts)
+
+
+def _extract_pages(pdf_path: str, start: int, end: int) -> str:
+    """在子行程中提取指定頁碼範圍的文字（fitz.Document 無法跨行程傳遞，需各自開啟）"""
+    with fitz.open(pdf_path) as doc:
+        return _read_pages(doc, start, end)
+
 
 class PDFProcessor:
     """PDF 文檔處理器"""
@@ -33,6 +55,17 @@ class PDFProcessor:
         self.processed_folder = Path("./documents/processed")
         self.chunk_size = 1000  # 每個文檔塊的字符數
         self.chunk_overlap = 200  # 重疊字符數
+        self.manifest_file = self.processed_folder / "manifest.json"  # 記錄檔案 (mtime_ns, size)
+        self.extract_workers = min(os.cpu_count() or 1, 4)  # 平行提取頁面的行程數
+        self.parallel_min_pages = 8  # 頁數少於此值時直接在本行程提取
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self.max_concurrent_files = min(8, os.cpu_count() or 1)  # 同時處理的 PDF 檔案數
+        self.ingest_batch_size = 256  # 每批寫入向量資料庫的文檔塊數
+        self.max_concurrent_uploads = 4  # 同時進行的寫入批次數
+        self._category_patterns = [
+            (category, re.compile("|".join(map(re.escape, keywords))))
+            for category, keywords in CATEGORY_KEYWORDS.items()
+        ]
         
         # 創建資料夾
         self.pdf_folder.mkdir(exist_ok=True)
@@ -41,50 +74,102 @@ class PDFProcessor:
     async def process_all_pdfs(self) -> bool:
         """處理所有 PDF 文檔"""
         try:
-            pdf_files = list(self.pdf_folder.glob("*.pdf"))
+            manifest = self._load_manifest()
+            pdf_files = self._scan_changed_pdfs(manifest)
             
             if not pdf_files:
-                logger.info("未找到 PDF 文檔")
+                logger.info("沒有新的或變更的 PDF 文檔")
                 return True
             
-            logger.info(f"找到 {len(pdf_files)} 個 PDF 文檔")
+            logger.info(f"找到 {len(pdf_files)} 個新的或變更的 PDF 文檔")
             
-            all_documents = []
+            sem = asyncio.Semaphore(self.max_concurrent_files)
+            upload_sem = asyncio.Semaphore(self.max_concurrent_uploads)
+            buffer: List[Dict[str, Any]] = []
+            pending: List[asyncio.Task] = []
+            batch_sources: List[set] = []  # 與 pending 對應，記錄每批包含的來源檔名
+            extracted: Dict[str, Tuple[Path, List[int]]] = {}  # 已分塊送出、待寫入結果確認的檔案
             
-            for pdf_file in pdf_files:
-                # 檢查是否已處理
-                if self._is_processed(pdf_file):
-                    logger.info(f"跳過已處理的文檔: {pdf_file.name}")
-                    continue
-                
-                logger.info(f"正在處理: {pdf_file.name}")
-                
-                # 提取文字
-                text = await self._extract_text_from_pdf(pdf_file)
-                if not text:
-                    logger.warning(f"無法提取文字: {pdf_file.name}")
-                    continue
-                
-                # 分塊處理
-                chunks = self._split_text_into_chunks(text)
-                
-                # 轉換為文檔格式
-                documents = self._create_documents(chunks, pdf_file)
-                all_documents.extend(documents)
-                
-                # 標記為已處理
-                self._mark_as_processed(pdf_file)
-                
-                logger.info(f"完成處理: {pdf_file.name} -> {len(documents)} 個文檔塊")
+            async def _upload(batch: List[Dict[str, Any]]) -> bool:
+                async with upload_sem:
+                    return await vector_db.add_documents(batch)
+            
+            def _flush(force: bool = False):
+                """緩衝區累積滿一批就送出寫入，force 時連同剩餘不足一批的也送出"""
+                while len(buffer) >= self.ingest_batch_size or (force and buffer):
+                    batch = buffer[:self.ingest_batch_size]
+                    del buffer[:self.ingest_batch_size]
+                    batch_sources.append({document["source"] for document in batch})
+                    pending.append(asyncio.create_task(_upload(batch)))
+            
+            async def _handle(pdf_file: Path, signature: List[int]) -> int:
+                async with sem:
+                    # 檢查內容是否已處理（僅 mtime 變動但內容相同的情況）
+                    if await asyncio.to_thread(self._is_processed, pdf_file):
+                        logger.info(f"跳過已處理的文檔: {pdf_file.name}")
+                        manifest[pdf_file.name] = signature
+                        return 0
+                    
+                    logger.info(f"正在處理: {pdf_file.name}")
+                    
+                    # 提取文字
+                    text = await self._extract_text_from_pdf(pdf_file)
+                    if not text:
+                        logger.warning(f"無法提取文字: {pdf_file.name}")
+                        return 0
+                    
+                    # 分塊並逐一轉換為文檔格式，累積滿一批就寫入向量資料庫
+                    count = 0
+                    for document in self._iter_documents(self._split_text_into_chunks(text), pdf_file):
+                        buffer.append(document)
+                        count += 1
+                        if len(buffer) >= self.ingest_batch_size:
+                            _flush()
+                    
+                    # 待所屬批次都寫入成功後才標記為已處理
+                    extracted[pdf_file.name] = (pdf_file, signature)
+                    
+                    logger.info(f"完成分塊: {pdf_file.name} -> {count} 個文檔塊")
+                    return count
             
-            # 批量新增到向量資料庫
-            if all_documents:
-                success = await vector_db.add_documents(all_documents)
-                if success:
-                    logger.info(f"成功新增 {len(all_documents)} 個文檔到向量資料庫")
-                else:
-                    logger.error("新增文檔到向量資料庫失敗")
-                    return False
+            # 多個檔案同時處理
+            counts = await asyncio.gather(*(
+                _handle(pdf_file, signature) for pdf_file, signature in pdf_files
+            ))
+            _flush(force=True)
+            
+            # 等待所有批次寫入完成，找出有批次失敗的檔案
+            results = await asyncio.gather(*pending, return_exceptions=True)
+            failed_sources = set()
+            for sources, ok in zip(batch_sources, results):
+                if ok is not True:
+                    failed_sources |= sources
+            
+            # 只標記所有批次都寫入成功的檔案，失敗的檔案下次會重新處理
+            succeeded = [
+                (name, pdf_file, signature)
+                for name, (pdf_file, signature) in extracted.items()
+                if name not in failed_sources
+            ]
+            await asyncio.gather(*(
+                asyncio.to_thread(self._mark_as_processed, pdf_file)
+                for _, pdf_file, _ in succeeded
+            ))
+            for name, _, signature in succeeded:
+                manifest[name] = signature
+            
+            self._save_manifest(manifest)
+            
+            failed_batches = sum(1 for ok in results if ok is not True)
+            if failed_batches:
+                logger.error(
+                    f"新增文檔到向量資料庫失敗（{failed_batches}/{len(pending)} 批），"
+                    f"未標記的檔案: {', '.join(sorted(failed_sources))}"
+                )
+                return False
+            
+            if pending:
+                logger.info(f"成功新增 {sum(counts)} 個文檔到向量資料庫（{len(pending)} 批）")
             
             return True
             
@@ -95,16 +180,7 @@ class PDFProcessor:
     async def _extract_text_from_pdf(self, pdf_path: Path) -> str:
         """從 PDF 提取文字"""
         try:
-            text = ""
-            
-            # 優先使用 PyMuPDF (更好的文字提取)
-            if HAS_PYMUPDF:
-                text = await self._extract_with_pymupdf(pdf_path)
-            elif HAS_PYPDF2:
-                text = await self._extract_with_pypdf2(pdf_path)
-            else:
-                logger.error("沒有安裝 PDF 處理庫 (PyMuPDF 或 PyPDF2)")
-                return ""
+            text = await self._extract_with_pymupdf(pdf_path)
             
             # 清理文字
             text = self._clean_text(text)
@@ -115,116 +191,146 @@ class PDFProcessor:
             logger.error(f"提取 PDF 文字失敗: {e}")
             return ""
     
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        """取得共用的行程池，第一次使用時才建立"""
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(max_workers=self.extract_workers)
+        return self._process_pool
+    
     async def _extract_with_pymupdf(self, pdf_path: Path) -> str:
-        """使用 PyMuPDF 提取文字"""
+        """使用 PyMuPDF 提取文字，頁數較多時將頁面範圍分配到多個行程平行提取"""
         try:
-            doc = fitz.open(str(pdf_path))
-            text = ""
-            
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                text += page.get_text()
-            
-            doc.close()
-            return text
+            # 此處只取得頁數，實際提取一律交給子行程（PyMuPDF 非執行緒安全，不可在多個執行緒中同時使用）
+            with fitz.open(str(pdf_path)) as doc:
+                page_count = doc.page_count
             
-        except Exception as e:
-            logger.error(f"PyMuPDF 提取失敗: {e}")
-            return ""
-    
-    async def _extract_with_pypdf2(self, pdf_path: Path) -> str:
-        """使用 PyPDF2 提取文字"""
-        try:
-            text = ""
+            if page_count < self.parallel_min_pages or self.extract_workers <= 1:
+                # 頁數少時整份交給單一子行程提取
+                step = max(page_count, 1)
+            else:
+                # 將頁面切成與行程數相同的連續範圍
+                step = -(-page_count // self.extract_workers)
             
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                
-                for page_num in range(len(pdf_reader.pages)):
-                    page = pdf_reader.pages[page_num]
-                    text += page.extract_text()
+            page_ranges = [
+                (start, min(start + step, page_count))
+                for start in range(0, page_count, step)
+            ]
             
-            return text
+            loop = asyncio.get_running_loop()
+            pool = self._get_process_pool()
+            parts = await asyncio.gather(*(
+                loop.run_in_executor(pool, _extract_pages, str(pdf_path), start, end)
+                for start, end in page_ranges
+            ))
+            return "".join(parts)
             
         except Exception as e:
-            logger.error(f"PyPDF2 提取失敗: {e}")
+            logger.error(f"PyMuPDF 提取失敗: {e}")
             return ""
     
     def _clean_text(self, text: str) -> str:
         """清理文字"""
-        # 移除多餘的空白字符
-        text = ' '.join(text.split())
+        # 移除特殊字符（NUL 等控制字元）
+        text = text.translate(_CONTROL_CHARS)
         
-        # 移除特殊字符
-        text = text.replace('\x00', '')
+        # 移除多餘的空白字符
+        text = _WHITESPACE_RE.sub(' ', text)
         
         return text.strip()
     
-    def _split_text_into_chunks(self, text: str) -> List[str]:
-        """將文字分塊"""
-        if len(text) <= self.chunk_size:
-            return [text]
+    def _split_text_into_chunks(self, text: str) -> Iterator[str]:
+        """將文字分塊（逐塊產生）"""
+        n = len(text)
+        if n <= self.chunk_size:
+            yield text
+            return
         
-        chunks = []
         start = 0
         
-        while start < len(text):
+        while start < n:
             end = start + self.chunk_size
             
             # 如果不是最後一塊，尋找合適的分割點
-            if end < len(text):
-                # 尋找最近的句號或換行
-                for i in range(end, start, -1):
-                    if text[i] in '.。\n':
-                        end = i + 1
-                        break
+            if end < n:
+                # 尋找最近的句號或換行（rfind 範圍為 (start, end]）
+                cut = max(
+                    text.rfind('.', start + 1, end + 1),
+                    text.rfind('。', start + 1, end + 1),
+                    text.rfind('\n', start + 1, end + 1),
+                )
+                if cut > start:
+                    end = cut + 1
             
-            chunk = text[start:end]
-            chunks.append(chunk)
+            yield text[start:end]
             
             # 下一塊的開始位置 (考慮重疊)
             start = end - self.chunk_overlap
-            
-        return chunks
     
-    def _create_documents(self, chunks: List[str], pdf_file: Path) -> List[Dict[str, Any]]:
-        """創建文檔對象"""
-        documents = []
+    def _iter_documents(self, chunks: Iterable[str], pdf_file: Path) -> Iterator[Dict[str, Any]]:
+        """逐一創建文檔對象"""
+        stem = pdf_file.stem
         
-        for i, chunk in enumerate(chunks):
-            document = {
-                "id": f"{pdf_file.stem}_{i}",
-                "content": chunk,
-                "source": pdf_file.name,
-                "title": pdf_file.stem,
-                "category": self._determine_category(pdf_file.name),
-                "created_at": datetime.now().isoformat(),
-                "chunk_index": i,
-                "total_chunks": len(chunks)
-            }
-            documents.append(document)
+        # 同一份 PDF 的各塊共用的欄位只計算一次
+        template = {
+            "source": pdf_file.name,
+            "title": stem,
+            "category": self._determine_category(pdf_file.name),
+            "created_at": datetime.now().isoformat()
+        }
         
-        return documents
+        for i, chunk in enumerate(chunks):
+            document = template.copy()
+            document["id"] = f"{stem}_{i}"
+            document["content"] = chunk
+            document["chunk_index"] = i
+            yield document
     
     def _determine_category(self, filename: str) -> str:
         """根據檔案名稱確定類別"""
         filename_lower = filename.lower()
         
-        if any(keyword in filename_lower for keyword in ['product', '產品', 'feature', '功能']):
-            return "product"
-        elif any(keyword in filename_lower for keyword in ['price', '價格', 'pricing', '定價']):
-            return "pricing"
-        elif any(keyword in filename_lower for keyword in ['manual', '手冊', 'guide', '指南']):
-            return "manual"
-        elif any(keyword in filename_lower for keyword in ['faq', '常見問題', 'qa']):
-            return "faq"
-        else:
-            return "general"
+        for category, pattern in self._category_patterns:
+            if pattern.search(filename_lower):
+                return category
+        
+        return "general"
+    
+    def _scan_changed_pdfs(self, manifest: Dict[str, List[int]]) -> List[Tuple[Path, List[int]]]:
+        """以 stat 掃描 PDF 資料夾，只回傳 (mtime_ns, size) 與記錄不符的檔案"""
+        changed = []
+        with os.scandir(self.pdf_folder) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".pdf") or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                signature = [stat.st_mtime_ns, stat.st_size]
+                if manifest.get(entry.name) != signature:
+                    changed.append((Path(entry.path), signature))
+        return changed
+    
+    def _load_manifest(self) -> Dict[str, List[int]]:
+        """載入檔案狀態記錄"""
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+    
+    def _save_manifest(self, manifest: Dict[str, List[int]]):
+        """儲存檔案狀態記錄"""
+        with open(self.manifest_file, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
     
     def _get_file_hash(self, pdf_file: Path) -> str:
-        """獲取文檔的 hash 值"""
+        """獲取文檔的 hash 值（分段讀取，不將整個 PDF 載入記憶體）"""
         with open(pdf_file, 'rb') as f:
-            return hashlib.md5(f.read()).hexdigest()
+            if hasattr(hashlib, "file_digest"):  # Python 3.11+
+                return hashlib.file_digest(f, "blake2b").hexdigest()
+            
+            h = hashlib.blake2b()
+            while chunk := f.read(1 << 20):
+                h.update(chunk)
+            return h.hexdigest()
     
     def _is_processed(self, pdf_file: Path) -> bool:
         """檢查文檔是否已處理"""
@@ -233,20 +339,28 @@ class PDFProcessor:
         if not hash_file.exists():
             return False
         
-        # 比較 hash 值
-        current_hash = self._get_file_hash(pdf_file)
+        # 記錄格式為 "mtime_ns:size:hash"（舊版只有 hash）
         with open(hash_file, 'r') as f:
-            stored_hash = f.read().strip()
+            stored = f.read().strip().split(":")
+        stored_hash = stored[-1]
+        
+        # mtime 與大小都沒變就視為未變更，不需重新計算 hash
+        stat = pdf_file.stat()
+        if len(stored) == 3 and stored[:2] == [str(stat.st_mtime_ns), str(stat.st_size)]:
+            return True
         
+        # 比較 hash 值
+        current_hash = self._get_file_hash(pdf_file)
         return current_hash == stored_hash
     
     def _mark_as_processed(self, pdf_file: Path):
         """標記文檔為已處理"""
         hash_file = self.processed_folder / f"{pdf_file.stem}.hash"
+        stat = pdf_file.stat()
         current_hash = self._get_file_hash(pdf_file)
         
         with open(hash_file, 'w') as f:
-            f.write(current_hash)
+            f.write(f"{stat.st_mtime_ns}:{stat.st_size}:{current_hash}")
     
     async def reprocess_all(self) -> bool:
         """重新處理所有文檔"""
@@ -255,6 +369,7 @@ class PDFProcessor:
         # 清空處理記錄
         for hash_file in self.processed_folder.glob("*.hash"):
             hash_file.unlink()
+        self.manifest_file.unlink(missing_ok=True)
         
         # 重新處理
         return await self.process_all_pdfs()
@@ -276,14 +391,7 @@ async def main():
     print(f"🔄 重疊大小: {pdf_processor.chunk_overlap} 字符")
     print()
     
-    # 檢查依賴
-    if not HAS_PYMUPDF and not HAS_PYPDF2:
-        print("❌ 錯誤：沒有安裝 PDF 處理庫")
-        print("請安裝：pip install PyMuPDF 或 pip install PyPDF2")
-        return
-    
-    pdf_lib = "PyMuPDF" if HAS_PYMUPDF else "PyPDF2"
-    print(f"📖 使用 PDF 庫: {pdf_lib}")
+    print(f"📖 使用 PDF 庫: PyMuPDF {fitz.VersionBind}")
     print()
     
     # 處理文檔
@@ -0,0 +1,39 @@
+"""
+測試腳本共用工具
+"""
+import asyncio
+import logging
+import logging.handlers
+import queue
+import sys
+from typing import Any, Coroutine
+
+try:
+    import uvloop  # uvicorn[standard] 已一併安裝；Windows 等環境沒有時退回預設事件迴圈
+    _loop_factory = uvloop.new_event_loop
+except ImportError:
+    _loop_factory = None
+
+# 輸出經由佇列交給背景執行緒寫入 stdout，併發測試進行中不會因 print 阻塞事件迴圈
+_console_queue = queue.SimpleQueue()
+console_listener = logging.handlers.QueueListener(_console_queue, logging.StreamHandler(sys.stdout))
+
+
+def get_console(name: str) -> logging.Logger:
+    """取得寫入共用輸出佇列的 logger"""
+    console = logging.getLogger(name)
+    if not console.handlers:
+        console.addHandler(logging.handlers.QueueHandler(_console_queue))
+    console.setLevel(logging.INFO)
+    console.propagate = False
+    return console
+
+
+def run(main: Coroutine[Any, Any, Any]) -> Any:
+    """啟動輸出執行緒並以 uvloop（若可用）執行測試腳本的主協程"""
+    console_listener.start()
+    try:
+        with asyncio.Runner(loop_factory=_loop_factory) as runner:
+            return runner.run(main)
+    finally:
+        console_listener.stop()
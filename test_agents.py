@@ -7,6 +7,20 @@ import asyncio
 import json
 from datetime import datetime
 
+# 同時呼叫 LLM 後端的上限
+MAX_CONCURRENCY = 4
+
+
+async def gather_limited(coros):
+    """以 Semaphore 限制並行數量執行多個協程，結果依原順序返回"""
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    
+    async def _run(coro):
+        async with sem:
+            return await coro
+    
+    return await asyncio.gather(*(_run(coro) for coro in coros))
+
 
 async def test_chat_agent():
     """測試 ChatAgent"""
@@ -29,11 +43,12 @@ async def test_chat_agent():
         }
     ]
     
-    for i, test_case in enumerate(test_cases, 1):
+    responses = await gather_limited(chat_agent.process(t) for t in test_cases)
+    
+    for i, (test_case, response) in enumerate(zip(test_cases, responses), 1):
         print(f"\\n測試案例 {i}:")
         print(f"輸入: {test_case['user_input']}")
         
-        response = await chat_agent.process(test_case)
         print(f"回應: {response['content']}")
         print(f"元資料: {response['metadata']}")
 
@@ -61,11 +76,12 @@ async def test_rag_agent():
         }
     ]
     
-    for i, test_case in enumerate(test_cases, 1):
+    responses = await gather_limited(rag_agent.process(t) for t in test_cases)
+    
+    for i, (test_case, response) in enumerate(zip(test_cases, responses), 1):
         print(f"\\n測試案例 {i}:")
         print(f"輸入: {test_case['user_input']}")
         
-        response = await rag_agent.process(test_case)
         print(f"回應: {response['content']}")
         print(f"檢索到的文檔數: {response['metadata'].get('retrieved_docs', 0)}")
 
@@ -94,11 +110,12 @@ async def test_card_agent():
         }
     ]
     
-    for i, test_case in enumerate(test_cases, 1):
+    responses = await gather_limited(card_agent.process(t) for t in test_cases)
+    
+    for i, (test_case, response) in enumerate(zip(test_cases, responses), 1):
         print(f"\\n測試案例 {i}:")
         print(f"輸入: {test_case}")
         
-        response = await card_agent.process(test_case)
         print(f"回應: {response['content']}")
         print(f"元資料: {response['metadata']}")
 
@@ -129,11 +146,12 @@ async def test_calendar_agent():
         }
     ]
     
-    for i, test_case in enumerate(test_cases, 1):
+    responses = await gather_limited(calendar_agent.process(t) for t in test_cases)
+    
+    for i, (test_case, response) in enumerate(zip(test_cases, responses), 1):
         print(f"\\n測試案例 {i}:")
         print(f"輸入: {test_case['user_input']}")
         
-        response = await calendar_agent.process(test_case)
         print(f"回應: {response['content']}")
         print(f"元資料: {response['metadata']}")
 
@@ -169,12 +187,13 @@ async def test_control_agent():
         }
     ]
     
-    for i, test_case in enumerate(test_cases, 1):
+    responses = await gather_limited(control_agent.process(t) for t in test_cases)
+    
+    for i, (test_case, response) in enumerate(zip(test_cases, responses), 1):
         print(f"\\n測試案例 {i}:")
         print(f"輸入: {test_case['user_input']}")
         print(f"有圖片: {test_case['has_image']}")
         
-        response = await control_agent.process(test_case)
         print(f"路由決策: {response['metadata']['route_to']}")
         print(f"原因: {response['metadata']['reason']}")
         print(f"信心度: {response['metadata']['confidence']}")
@@ -231,9 +250,12 @@ async def test_vector_db():
         "API 整合"
     ]
     
-    for query in search_queries:
+    all_results = await gather_limited(
+        vector_db.search_similar(query, top_k=2) for query in search_queries
+    )
+    
+    for query, results in zip(search_queries, all_results):
         print(f"\\n搜索: '{query}'")
-        results = await vector_db.search_similar(query, top_k=2)
         
         for i, result in enumerate(results, 1):
             title = result.get('metadata', {}).get('title', 'Unknown')
@@ -3,8 +3,11 @@
 綜合測試腳本 - 測試所有 Agent 和 API 功能
 """
 import asyncio
-import json
+import hashlib
+import orjson
+import httpx
 import time
+from functools import cached_property, lru_cache
 from typing import Dict, Any
 import sys
 import os
@@ -12,47 +15,159 @@ import os
 # 添加專案根目錄到 Python 路徑
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.agents import ControlAgent, ChatAgent, RAGAgent, CardAgent, CalendarAgent
 from app.core.memory import memory_manager
 from app.core.logger import logger
-from app.core.tokenizer import get_token_counter
-from app.api.openai_compatible import api
 from app.api.models import ChatCompletionRequest, Message, MessageRole
 
+# 長輸入測試字串，於載入時建立一次
+_VERY_LONG_INPUT = "測試 " * 1000
+
+# 超過此長度的字串不進快取，避免長文撐大快取
+_TOKEN_CACHE_MAX_CHARS = 8192
+
+
+@lru_cache(maxsize=1)
+def _token_counter():
+    """延遲建立共用的 token 計算器"""
+    from app.core.tokenizer import get_token_counter
+    return get_token_counter()
+
+
+@lru_cache(maxsize=1024)
+def _count_tokens_cached(text: str) -> int:
+    return _token_counter().count_tokens(text)
+
+
+def _count_tokens(text: str) -> int:
+    """計算 token 數量，重複出現的短字串直接命中快取"""
+    if len(text) > _TOKEN_CACHE_MAX_CHARS:
+        return _token_counter().count_tokens(text)
+    return _count_tokens_cached(text)
+
+
+async def _gather_structured(*coros):
+    """併發執行 coroutine，依序回傳結果或例外
+    
+    Python 3.11+ 使用 TaskGroup：任一任務失敗即取消其餘任務，不留下佔用連線的孤兒任務，
+    被取消的任務以 CancelledError 表示；舊版則退回 gather(return_exceptions=True)。
+    """
+    if sys.version_info < (3, 11):
+        return await asyncio.gather(*coros, return_exceptions=True)
+    
+    tasks = []
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tasks = [tg.create_task(coro) for coro in coros]
+    except Exception as eg:
+        # 不用 except* 以保留舊版 Python 的語法相容
+        for error in getattr(eg, "exceptions", (eg,)):
+            logger.error(f"併發測試任務失敗: {error!r}")
+    
+    return [
+        asyncio.CancelledError() if task.cancelled() else (task.exception() or task.result())
+        for task in tasks
+    ]
+
 
 class TestRunner:
     """測試執行器"""
     
     def __init__(self):
-        self.control_agent = ControlAgent()
-        self.chat_agent = ChatAgent()
-        self.rag_agent = RAGAgent()
-        self.card_agent = CardAgent()
-        self.calendar_agent = CalendarAgent()
-        self.token_counter = get_token_counter()
+        # 所有 OpenAI 相容 Agent 共用同一個 HTTP 連線池，省去每次呼叫的 TCP/TLS 握手
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+            timeout=60
+        )
         
         self.test_session_id = "test_session_001"
-        self.test_results = []
+        
+        # 測試結果逐筆寫入 JSONL，總結只需計數與失敗清單
+        self._results_fh = open("test_results.jsonl", "wb", buffering=0)
+        self._total = 0
+        self._passed = 0
+        self._failures = []
+        self._route_cache = {}  # (user_input, has_image, 有無 profile) -> 路由 Task
+    
+    # Agent 與 token 計數器延遲到第一次使用時才建立，只執行部分測試時不必全部載入
+    @cached_property
+    def control_agent(self):
+        from app.agents import ControlAgent
+        return ControlAgent()
+    
+    @cached_property
+    def chat_agent(self):
+        from app.agents import ChatAgent
+        return ChatAgent()
+    
+    @cached_property
+    def rag_agent(self):
+        from app.agents import RAGAgent
+        return RAGAgent()
+    
+    @cached_property
+    def card_agent(self):
+        from app.agents import CardAgent
+        return CardAgent(http_async_client=self._http)
+    
+    @cached_property
+    def calendar_agent(self):
+        from app.agents import CalendarAgent
+        return CalendarAgent(http_async_client=self._http)
+    
+    @cached_property
+    def _agent_dispatch(self):
+        """路由目標名稱 -> Agent"""
+        return {
+            "chat_agent": self.chat_agent,
+            "rag_agent": self.rag_agent,
+            "calendar_agent": self.calendar_agent
+        }
     
     def print_header(self, title: str):
         """打印測試標題"""
-        print(f"\n{'='*60}")
-        print(f"  {title}")
-        print(f"{'='*60}")
+        sys.stdout.write(f"\n{'='*60}\n  {title}\n{'='*60}\n")
     
     def print_test_result(self, test_name: str, success: bool, details: str = ""):
         """打印測試結果"""
         status = "✅ PASS" if success else "❌ FAIL"
-        print(f"{status} {test_name}")
+        # 單次寫入、不逐行 flush，併發測試不會為了 stdout 互相等待
+        msg = f"{status} {test_name}\n"
         if details:
-            print(f"   {details}")
+            msg += f"   {details}\n"
+        sys.stdout.write(msg)
         
-        self.test_results.append({
+        record = {
             "test_name": test_name,
             "success": success,
             "details": details,
             "timestamp": time.time()
-        })
+        }
+        self._results_fh.write(orjson.dumps(record) + b"\n")
+        
+        self._total += 1
+        if success:
+            self._passed += 1
+        else:
+            self._failures.append((test_name, details))
+    
+    async def _route(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """以 ControlAgent 路由，相同輸入共用同一次呼叫的結果"""
+        key = (
+            input_data["user_input"],
+            input_data.get("has_image", False),
+            bool(input_data.get("user_profile"))
+        )
+        task = self._route_cache.get(key)
+        if task is None:
+            # 快取 Task 而非結果，讓同時發出的相同查詢也只呼叫一次
+            task = asyncio.ensure_future(self.control_agent.process(input_data))
+            self._route_cache[key] = task
+        
+        try:
+            return await task
+        except Exception:
+            self._route_cache.pop(key, None)
+            raise
     
     async def test_basic_functionality(self):
         """測試基本功能"""
@@ -69,7 +184,7 @@ class TestRunner:
         # 測試 Token 計算
         try:
             test_text = "Hello, this is a test message. 你好，這是一個測試訊息。"
-            token_count = self.token_counter.count_tokens(test_text)
+            token_count = _count_tokens(test_text)
             self.print_test_result(
                 "Token 計算", 
                 token_count > 0, 
@@ -155,34 +270,43 @@ class TestRunner:
             }
         ]
         
-        for test_case in test_cases:
+        async def _run(test_case):
+            start_ns = time.perf_counter_ns()
             try:
-                start_time = time.time()
                 result = await test_case["agent"].process(test_case["input"])
-                duration = time.time() - start_time
-                
-                success = (
-                    result and 
-                    "content" in result and 
-                    isinstance(result["content"], str) and
-                    len(result["content"]) > 0
-                )
-                
-                details = f"耗時: {duration:.2f}s, 回應長度: {len(result.get('content', ''))}"
-                if not success:
-                    details += f", 結果: {result}"
-                
-                self.print_test_result(test_case["name"], success, details)
-                
+                return test_case, result, (time.perf_counter_ns() - start_ns) / 1e9, None
             except Exception as e:
-                self.print_test_result(test_case["name"], False, str(e))
+                return test_case, None, 0, e
+        
+        # 各 Agent 測試互不相依，同時執行後依原順序輸出
+        results = await _gather_structured(*[_run(test_case) for test_case in test_cases])
+        
+        for test_case, result, duration, error in results:
+            if error is not None:
+                self.print_test_result(test_case["name"], False, str(error))
+                continue
+            
+            success = (
+                result and 
+                "content" in result and 
+                isinstance(result["content"], str) and
+                len(result["content"]) > 0
+            )
+            
+            details = f"耗時: {duration:.2f}s, 回應長度: {len((result or {}).get('content', ''))}"
+            if not success:
+                details += f", 結果: {result}"
+            
+            self.print_test_result(test_case["name"], success, details)
     
     async def test_openai_api(self):
         """測試 OpenAI 相容 API"""
         self.print_header("OpenAI API 測試")
         
-        # 測試聊天完成
-        try:
+        # OpenAI API 物件會一併建立所有 Agent，只在執行此測試時載入
+        from app.api.openai_compatible import api
+        
+        async def _timed_chat():
             request = ChatCompletionRequest(
                 model="aisales-v1",
                 messages=[
@@ -193,9 +317,21 @@ class TestRunner:
                 stream=False
             )
             
-            start_time = time.time()
+            start_ns = time.perf_counter_ns()
             response = await api.chat_completions(request)
-            duration = time.time() - start_time
+            return response, (time.perf_counter_ns() - start_ns) / 1e9
+        
+        # 聊天完成與模型列表互不相依，同時執行（get_models 為同步函式，放到執行緒中）
+        chat_outcome, models = await _gather_structured(
+            _timed_chat(),
+            asyncio.to_thread(api.get_models)
+        )
+        
+        # 測試聊天完成
+        try:
+            if isinstance(chat_outcome, BaseException):
+                raise chat_outcome
+            response, duration = chat_outcome
             
             success = (
                 response and
@@ -215,7 +351,8 @@ class TestRunner:
         
         # 測試模型列表
         try:
-            models = api.get_models()
+            if isinstance(models, BaseException):
+                raise models
             success = models and models.data and len(models.data) > 0
             details = f"模型數量: {len(models.data) if models.data else 0}"
             
@@ -252,28 +389,25 @@ class TestRunner:
             try:
                 conversation_success = True
                 conversation_details = []
+                # 場景名稱含中文，以雜湊產生固定且安全的 session ID，整個場景共用
+                scenario_key = hashlib.md5(scenario["name"].encode()).hexdigest()[:8]
+                session_id = sys.intern(f"{self.test_session_id}_scenario_{scenario_key}")
                 
                 for step_idx, user_input in enumerate(scenario["steps"]):
                     input_data = {
                         "user_input": user_input,
-                        "session_id": f"{self.test_session_id}_scenario_{scenario['name']}",
+                        "session_id": session_id,
                         "has_image": False,
                         "user_profile": {}
                     }
                     
                     # 使用 ControlAgent 進行路由
-                    route_result = await self.control_agent.process(input_data)
+                    route_result = await self._route(input_data)
                     target_agent = route_result["metadata"]["route_to"]
                     
-                    # 根據路由結果調用對應 Agent
-                    if target_agent == "chat_agent":
-                        result = await self.chat_agent.process(input_data)
-                    elif target_agent == "rag_agent":
-                        result = await self.rag_agent.process(input_data)
-                    elif target_agent == "calendar_agent":
-                        result = await self.calendar_agent.process(input_data)
-                    else:
-                        result = await self.chat_agent.process(input_data)
+                    # 根據路由結果調用對應 Agent，未知路由退回 ChatAgent
+                    agent = self._agent_dispatch.get(target_agent, self.chat_agent)
+                    result = await agent.process(input_data)
                     
                     if not result or not result.get("content"):
                         conversation_success = False
@@ -313,9 +447,8 @@ class TestRunner:
         
         # 測試異常長的輸入
         try:
-            long_input = "測試 " * 1000
             result = await self.chat_agent.process({
-                "user_input": long_input,
+                "user_input": _VERY_LONG_INPUT,
                 "session_id": self.test_session_id,
                 "has_image": False,
                 "user_profile": {}
@@ -326,43 +459,67 @@ class TestRunner:
             
         except Exception as e:
             self.print_test_result("長輸入處理", False, str(e))
+        
+        # 測試內容政策攔截：危險輸入應回傳 400，而非被包成 500
+        from fastapi import HTTPException
+        from app.api.openai_compatible import api
+        try:
+            await api.chat_completions(ChatCompletionRequest(
+                model="aisales-v1",
+                messages=[
+                    Message(role=MessageRole.USER, content="<script>alert('x')</script>")
+                ],
+                stream=False
+            ))
+            self.print_test_result("內容政策攔截", False, "危險內容未被攔截")
+            
+        except HTTPException as e:
+            self.print_test_result("內容政策攔截", e.status_code == 400, f"狀態碼: {e.status_code}")
+        except Exception as e:
+            self.print_test_result("內容政策攔截", False, str(e))
     
     def print_summary(self):
         """打印測試總結"""
         self.print_header("測試總結")
         
-        total_tests = len(self.test_results)
-        passed_tests = sum(1 for result in self.test_results if result["success"])
+        total_tests = self._total
+        passed_tests = self._passed
         failed_tests = total_tests - passed_tests
         
-        print(f"總測試數量: {total_tests}")
-        print(f"通過測試: {passed_tests}")
-        print(f"失敗測試: {failed_tests}")
-        print(f"通過率: {passed_tests/total_tests*100:.1f}%")
+        lines = [
+            f"總測試數量: {total_tests}",
+            f"通過測試: {passed_tests}",
+            f"失敗測試: {failed_tests}",
+            f"通過率: {passed_tests/total_tests*100:.1f}%",
+        ]
         
         if failed_tests > 0:
-            print("\n失敗的測試:")
-            for result in self.test_results:
-                if not result["success"]:
-                    print(f"  ❌ {result['test_name']}: {result['details']}")
-        
-        # 儲存測試結果
-        with open("test_results.json", "w", encoding="utf-8") as f:
-            json.dump(self.test_results, f, ensure_ascii=False, indent=2)
+            lines.append("\n失敗的測試:")
+            lines.extend(f"  ❌ {test_name}: {details}" for test_name, details in self._failures)
         
-        print(f"\n測試結果已儲存至 test_results.json")
+        lines.append("\n測試結果已儲存至 test_results.jsonl")
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
     
     async def run_all_tests(self):
         """執行所有測試"""
         print("🚀 開始執行 AI Sales 系統綜合測試...")
         
-        await self.test_basic_functionality()
-        await self.test_agents()
-        await self.test_openai_api()
-        await self.test_integration_scenarios()
-        await self.test_error_handling()
-        
-        self.print_summary()
+        try:
+            for test in (
+                self.test_basic_functionality,
+                self.test_agents,
+                self.test_openai_api,
+                self.test_integration_scenarios,
+                self.test_error_handling
+            ):
+                await test()
+                sys.stdout.flush()
+            
+            self.print_summary()
+        finally:
+            self._results_fh.close()
+            await self._http.aclose()
 
 
 async def main():
@@ -1,137 +1,281 @@
 #!/usr/bin/env python3
 """
 測試 Swagger 文檔功能
+
+加上 --batch-size / --repeats 時改為壓力測試：每輪同時送出 batch-size 個聊天請求，共 repeats 輪
 """
 
-import requests
-import json
+import argparse
+import asyncio
+import statistics
+import httpx
+import orjson
+import time
 
-def test_swagger_docs():
-    """測試 Swagger 文檔功能"""
-    base_url = "http://localhost:8000"
-    
-    print("=== 測試 AI Sales API Swagger 文檔 ===\n")
+from script_utils import get_console, run
+
+console = get_console("test_swagger_docs")
+
+BASE_URL = "http://localhost:8000"
+SEPARATOR = "\n" + "="*50 + "\n"
+
+# 虛擬人模式：簡短互動
+_PAYLOAD_VIRTUAL = {
+    "model": "aisales-v1",
+    "messages": [
+        {"role": "user", "content": "你好，介紹一下你們的產品"}
+    ],
+    "max_tokens": 50,
+    "temperature": 0.8,
+    "stream": False
+}
+
+# 一般模式：詳細回應
+_PAYLOAD_NORMAL = {
+    "model": "aisales-v1",
+    "messages": [
+        {"role": "user", "content": "詳細介紹一下你們的產品特色"}
+    ],
+    "max_tokens": 500,
+    "temperature": 0.7,
+    "stream": False
+}
+
+# 依預期回應長度分組：同組請求同時送出，避免短回應被長回應拖住
+# 請求內容於載入時以 orjson 預先編碼
+_SHORT_BODIES = (orjson.dumps(_PAYLOAD_VIRTUAL),)  # max_tokens ≤ 200
+_LONG_BODIES = (orjson.dumps(_PAYLOAD_NORMAL),)    # max_tokens > 200
+
+# 串流模式：量測首個 token 延遲
+_STREAM_BODY = orjson.dumps({**_PAYLOAD_NORMAL, "stream": True})
+
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+async def measure_stream(client):
+    """以 SSE 串流呼叫聊天完成，回傳 (狀態碼, 首 token 延遲, 總耗時, 區塊數, 內容)"""
+    start = time.perf_counter()
+    t_first = None
+    chunks = []
+    async with client.stream("POST", "/v1/chat/completions", content=_STREAM_BODY, headers=_JSON_HEADERS) as response:
+        if response.status_code != 200:
+            await response.aread()
+            return response.status_code, None, time.perf_counter() - start, 0, response.text
+        
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            data = line[6:]
+            if data == "[DONE]":
+                break
+            event = orjson.loads(data)
+            if "error" in event:
+                raise RuntimeError(event["error"]["message"])
+            delta = event["choices"][0]["delta"].get("content")
+            if delta:
+                if t_first is None:
+                    t_first = time.perf_counter()
+                chunks.append(delta)
     
-    # 1. 測試根路徑
-    print("1. 測試根路徑 (/)")
+    return 200, (t_first - start) if t_first else None, time.perf_counter() - start, len(chunks), "".join(chunks)
+
+async def run_bin(client, bodies):
+    """同時送出同一組的聊天請求，回傳 (回應清單, 耗時)"""
+    start = time.perf_counter()
+    responses = await asyncio.gather(
+        *[client.post("/v1/chat/completions", content=body, headers=_JSON_HEADERS) for body in bodies],
+        return_exceptions=True
+    )
+    return responses, time.perf_counter() - start
+
+def print_bin_table(bins):
+    """列出各組的請求數、耗時與產生 token 的吞吐量"""
+    console.info("   分組      請求數   耗時      completion tokens   tokens/s")
+    for name, (responses, elapsed) in bins:
+        tokens = sum(
+            orjson.loads(response.content)["usage"]["completion_tokens"]
+            for response in responses
+            if not isinstance(response, BaseException) and response.status_code == 200
+        )
+        console.info(f"   {name:<8}  {len(responses):>6}   {elapsed:6.2f}s   {tokens:>17}   {tokens / elapsed if elapsed else 0:8.1f}")
+    console.info(SEPARATOR)
+
+def print_json_response(title, response):
+    """打印 JSON 端點的回應"""
+    console.info(title)
     try:
-        response = requests.get(f"{base_url}/")
-        print(f"   狀態碼: {response.status_code}")
-        print(f"   回應: {json.dumps(response.json(), indent=2, ensure_ascii=False)}")
+        if isinstance(response, BaseException):
+            raise response
+        console.info(f"   狀態碼: {response.status_code}")
+        data = orjson.loads(response.content)
+        console.info(f"   回應: {orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()}")
     except Exception as e:
-        print(f"   錯誤: {e}")
-    
-    print("\n" + "="*50 + "\n")
-    
-    # 2. 測試健康檢查
-    print("2. 測試健康檢查 (/health)")
+        console.info(f"   錯誤: {e}")
+    console.info(SEPARATOR)
+
+def print_chat_response(title, response):
+    """打印聊天完成端點的回應"""
+    console.info(title)
     try:
-        response = requests.get(f"{base_url}/health")
-        print(f"   狀態碼: {response.status_code}")
-        print(f"   回應: {json.dumps(response.json(), indent=2, ensure_ascii=False)}")
+        if isinstance(response, BaseException):
+            raise response
+        console.info(f"   狀態碼: {response.status_code}")
+        if response.status_code == 200:
+            result = orjson.loads(response.content)
+            console.info(f"   回應內容: {result['choices'][0]['message']['content']}")
+            console.info(f"   Token 使用: {result['usage']}")
+        else:
+            console.info(f"   錯誤: {response.text}")
     except Exception as e:
-        print(f"   錯誤: {e}")
+        console.info(f"   錯誤: {e}")
+    console.info(SEPARATOR)
+
+async def run_swagger_docs(client):
+    """測試 Swagger 文檔功能"""
+    base_url = BASE_URL
     
-    print("\n" + "="*50 + "\n")
+    console.info("=== 測試 AI Sales API Swagger 文檔 ===\n")
     
-    # 3. 測試模型列表
-    print("3. 測試模型列表 (/v1/models)")
+    # 查詢端點與短回應組同時送出，長回應組隨後送出，結果依序輸出
+    root, health, models, short_bin = await asyncio.gather(
+        client.get("/"),
+        client.get("/health"),
+        client.get("/v1/models"),
+        run_bin(client, _SHORT_BODIES),
+        return_exceptions=True
+    )
+    long_bin = await run_bin(client, _LONG_BODIES)
+    
+    # 串流請求單獨執行，避免首 token 延遲受其他請求影響
     try:
-        response = requests.get(f"{base_url}/v1/models")
-        print(f"   狀態碼: {response.status_code}")
-        print(f"   回應: {json.dumps(response.json(), indent=2, ensure_ascii=False)}")
+        stream_outcome = await measure_stream(client)
     except Exception as e:
-        print(f"   錯誤: {e}")
+        stream_outcome = e
     
-    print("\n" + "="*50 + "\n")
+    # 1. 測試根路徑
+    print_json_response("1. 測試根路徑 (/)", root)
+    
+    # 2. 測試健康檢查
+    print_json_response("2. 測試健康檢查 (/health)", health)
+    
+    # 3. 測試模型列表
+    print_json_response("3. 測試模型列表 (/v1/models)", models)
     
     # 4. 測試聊天完成 - 虛擬人模式
-    print("4. 測試聊天完成 - 虛擬人模式")
-    try:
-        payload = {
-            "model": "aisales-v1",
-            "messages": [
-                {"role": "user", "content": "你好，介紹一下你們的產品"}
-            ],
-            "max_tokens": 50,
-            "temperature": 0.8,
-            "stream": False
-        }
-        
-        response = requests.post(
-            f"{base_url}/v1/chat/completions",
-            json=payload,
-            headers={"Content-Type": "application/json"}
-        )
-        
-        print(f"   狀態碼: {response.status_code}")
-        if response.status_code == 200:
-            result = response.json()
-            print(f"   回應內容: {result['choices'][0]['message']['content']}")
-            print(f"   Token 使用: {result['usage']}")
+    print_chat_response("4. 測試聊天完成 - 虛擬人模式", short_bin[0][0])
+    
+    # 5. 測試聊天完成 - 一般模式
+    print_chat_response("5. 測試聊天完成 - 一般模式", long_bin[0][0])
+    
+    console.info("   分組吞吐量")
+    print_bin_table((("短回應", short_bin), ("長回應", long_bin)))
+    
+    # 6. 測試聊天完成 - 串流模式
+    console.info("6. 測試聊天完成 - 串流模式")
+    if isinstance(stream_outcome, Exception):
+        console.info(f"   錯誤: {stream_outcome}")
+    else:
+        status_code, ttft, total, chunk_count, content = stream_outcome
+        console.info(f"   狀態碼: {status_code}")
+        if status_code != 200:
+            console.info(f"   錯誤: {content}")
+        elif ttft is None:
+            console.info("   錯誤: 未收到任何內容區塊")
         else:
-            print(f"   錯誤: {response.text}")
-    except Exception as e:
-        print(f"   錯誤: {e}")
+            console.info(f"   首 token 延遲: {ttft:.2f}s")
+            console.info(f"   總耗時: {total:.2f}s, 區塊數: {chunk_count}")
+            if chunk_count > 1:
+                console.info(f"   平均區塊間隔: {(total - ttft) / (chunk_count - 1) * 1000:.1f}ms")
+            console.info(f"   回應內容: {content}")
     
-    print("\n" + "="*50 + "\n")
+    console.info(SEPARATOR)
     
-    # 5. 測試聊天完成 - 一般模式
-    print("5. 測試聊天完成 - 一般模式")
+    # 7. 顯示 Swagger 文檔連結
+    console.info("7. Swagger 文檔連結")
+    console.info(f"   📖 API 文檔: {base_url}/docs")
+    console.info(f"   📋 OpenAPI 規範: {base_url}/openapi.json")
+    console.info(f"   🎨 Streamlit UI: http://localhost:8501")
+    console.info(f"   🎮 Gradio UI: http://localhost:7860")
+    
+    console.info(SEPARATOR)
+    
+    # 8. 參數說明
+    console.info("8. 參數使用建議")
+    console.info("   虛擬人模式 (簡短互動):")
+    console.info("   - max_tokens: 50-200")
+    console.info("   - temperature: 0.8")
+    console.info("   - 適用: 快速對話、即時互動")
+    console.info("")
+    console.info("   一般文字模式 (詳細回應):")
+    console.info("   - max_tokens: 100-2000")
+    console.info("   - temperature: 0.7")
+    console.info("   - 適用: 產品介紹、詳細諮詢")
+    console.info("")
+    console.info("   RAG 知識查詢 (準確回應):")
+    console.info("   - max_tokens: 800")
+    console.info("   - temperature: 0.5")
+    console.info("   - 適用: 技術問題、資料查詢")
+
+async def timed_chat(client, body):
+    """送出一個聊天請求，回傳 (耗時, completion tokens)；失敗時 tokens 為 None"""
+    start = time.perf_counter()
     try:
-        payload = {
-            "model": "aisales-v1",
-            "messages": [
-                {"role": "user", "content": "詳細介紹一下你們的產品特色"}
-            ],
-            "max_tokens": 500,
-            "temperature": 0.7,
-            "stream": False
-        }
-        
-        response = requests.post(
-            f"{base_url}/v1/chat/completions",
-            json=payload,
-            headers={"Content-Type": "application/json"}
+        response = await client.post("/v1/chat/completions", content=body, headers=_JSON_HEADERS, timeout=120)
+        tokens = orjson.loads(response.content)["usage"]["completion_tokens"] if response.status_code == 200 else None
+    except Exception:
+        tokens = None
+    return time.perf_counter() - start, tokens
+
+def percentile(sorted_values, pct):
+    """已排序數列的百分位數，樣本不足時退回單一值"""
+    if len(sorted_values) < 2:
+        return sorted_values[0]
+    return statistics.quantiles(sorted_values, n=100, method="inclusive")[pct - 1]
+
+async def run_load_test(client, batch_size, repeats):
+    """壓力測試：每輪同時送出 batch_size 個相同的聊天請求，統計延遲分布與吞吐量"""
+    console.info(f"=== 聊天完成壓力測試：每輪 {batch_size} 個併發請求，共 {repeats} 輪 ===\n")
+    
+    samples = []
+    wall_start = time.perf_counter()
+    for round_idx in range(repeats):
+        round_samples = await asyncio.gather(
+            *[timed_chat(client, _SHORT_BODIES[0]) for _ in range(batch_size)]
         )
-        
-        print(f"   狀態碼: {response.status_code}")
-        if response.status_code == 200:
-            result = response.json()
-            print(f"   回應內容: {result['choices'][0]['message']['content']}")
-            print(f"   Token 使用: {result['usage']}")
+        samples.extend(round_samples)
+        console.info(f"   第 {round_idx + 1} 輪完成")
+    total_wall = time.perf_counter() - wall_start
+    
+    latencies = sorted(elapsed for elapsed, tokens in samples if tokens is not None)
+    tokens_total = sum(tokens for _, tokens in samples if tokens is not None)
+    failed = len(samples) - len(latencies)
+    
+    console.info(SEPARATOR)
+    console.info(f"   請求總數: {len(samples)}，失敗: {failed}")
+    if latencies:
+        # 伺服器在工作流完成後才開始串流，單次延遲即接近首 token 延遲
+        console.info(f"   延遲 p50: {percentile(latencies, 50):.2f}s, p95: {percentile(latencies, 95):.2f}s")
+    console.info(f"   總耗時: {total_wall:.2f}s")
+    console.info(f"   吞吐量: {tokens_total / total_wall:.1f} tokens/s, {len(latencies) / total_wall:.2f} 請求/s")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="AI Sales API Swagger 文檔與聊天完成測試")
+    parser.add_argument("--batch-size", type=int, default=1, help="壓力測試每輪的併發請求數")
+    parser.add_argument("--repeats", type=int, default=1, help="壓力測試的輪數")
+    return parser.parse_args()
+
+async def main(args):
+    """整個執行期間共用同一個 HTTP 連線池，冒煙測試與壓力測試都沿用"""
+    limits = httpx.Limits(
+        max_keepalive_connections=32,
+        max_connections=max(64, args.batch_size)  # 壓力測試的每輪請求都能取得連線
+    )
+    # 只限制連線時間；LLM 回應（含串流）可能超過 30 秒，不設讀取逾時
+    timeout = httpx.Timeout(5.0, read=None)
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=timeout, limits=limits) as client:
+        if args.batch_size > 1 or args.repeats > 1:
+            await run_load_test(client, args.batch_size, args.repeats)
         else:
-            print(f"   錯誤: {response.text}")
-    except Exception as e:
-        print(f"   錯誤: {e}")
-    
-    print("\n" + "="*50 + "\n")
-    
-    # 6. 顯示 Swagger 文檔連結
-    print("6. Swagger 文檔連結")
-    print(f"   📖 API 文檔: {base_url}/docs")
-    print(f"   📋 OpenAPI 規範: {base_url}/openapi.json")
-    print(f"   🎨 Streamlit UI: http://localhost:8501")
-    print(f"   🎮 Gradio UI: http://localhost:7860")
-    
-    print("\n" + "="*50 + "\n")
-    
-    # 7. 參數說明
-    print("7. 參數使用建議")
-    print("   虛擬人模式 (簡短互動):")
-    print("   - max_tokens: 50-200")
-    print("   - temperature: 0.8")
-    print("   - 適用: 快速對話、即時互動")
-    print()
-    print("   一般文字模式 (詳細回應):")
-    print("   - max_tokens: 100-2000")
-    print("   - temperature: 0.7")
-    print("   - 適用: 產品介紹、詳細諮詢")
-    print()
-    print("   RAG 知識查詢 (準確回應):")
-    print("   - max_tokens: 800")
-    print("   - temperature: 0.5")
-    print("   - 適用: 技術問題、資料查詢")
+            await run_swagger_docs(client)
 
 if __name__ == "__main__":
-    test_swagger_docs()
+    run(main(parse_args()))
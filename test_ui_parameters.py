@@ -4,43 +4,52 @@
 """
 import asyncio
 from app.core.ui_handler import process_user_request
+from script_utils import get_console, run
+
+console = get_console("test_ui_parameters")
 
 async def test_ui_parameters():
     """測試UI參數功能"""
     
-    # 測試一般文字模式
-    print("=== 測試一般文字模式 ===")
-    result_chat, profile = await process_user_request(
-        message="你好，我想了解你們的產品",
-        image=None,
-        user_profile={},
-        interaction_mode="sales",
-        response_mode="chat",
-        max_tokens=200,
-        temperature=0.7
+    # 兩種模式互不相依，各用獨立 session 同時執行，避免對話記錄互相干擾
+    (result_chat, _), (result_virtual, _) = await asyncio.gather(
+        process_user_request(
+            message="你好，我想了解你們的產品",
+            image=None,
+            user_profile={},
+            interaction_mode="sales",
+            response_mode="chat",
+            max_tokens=200,
+            temperature=0.7,
+            session_id="test_ui_chat"
+        ),
+        process_user_request(
+            message="你好，我想了解你們的產品",
+            image=None,
+            user_profile={},
+            interaction_mode="sales",
+            response_mode="virtual_human",
+            max_tokens=50,
+            temperature=0.8,
+            session_id="test_ui_virtual_human"
+        )
     )
-    print(f"一般模式回應: {result_chat}")
-    print(f"回應長度: {len(result_chat)}")
+    
+    # 測試一般文字模式
+    console.info("=== 測試一般文字模式 ===")
+    console.info(f"一般模式回應: {result_chat}")
+    console.info(f"回應長度: {len(result_chat)}")
     
     # 測試虛擬人模式
-    print("\n=== 測試虛擬人模式 ===")
-    result_virtual, profile = await process_user_request(
-        message="你好，我想了解你們的產品",
-        image=None,
-        user_profile={},
-        interaction_mode="sales",
-        response_mode="virtual_human",
-        max_tokens=50,
-        temperature=0.8
-    )
-    print(f"虛擬人模式回應: {result_virtual}")
-    print(f"回應長度: {len(result_virtual)}")
+    console.info("\n=== 測試虛擬人模式 ===")
+    console.info(f"虛擬人模式回應: {result_virtual}")
+    console.info(f"回應長度: {len(result_virtual)}")
     
     # 比較回應長度
-    print(f"\n=== 比較結果 ===")
-    print(f"一般模式長度: {len(result_chat)} 字")
-    print(f"虛擬人模式長度: {len(result_virtual)} 字")
-    print(f"長度差異: {len(result_chat) - len(result_virtual)} 字")
+    console.info(f"\n=== 比較結果 ===")
+    console.info(f"一般模式長度: {len(result_chat)} 字")
+    console.info(f"虛擬人模式長度: {len(result_virtual)} 字")
+    console.info(f"長度差異: {len(result_chat) - len(result_virtual)} 字")
 
 if __name__ == "__main__":
-    asyncio.run(test_ui_parameters())
+    run(test_ui_parameters())
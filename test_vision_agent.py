@@ -6,61 +6,114 @@ import sys
 import os
 import asyncio
 import base64
-from PIL import Image
-import io
+from functools import lru_cache
+import httpx
 
 # 添加專案路徑
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from app.agents.vision_agent import VisionAgent
 from app.config.settings import settings
+from script_utils import get_console, run
+
+console = get_console("test_vision_agent")
+
+# 視覺模型設定只讀取一次
+_API_KEY, _BASE_URL, _MODEL = settings.vision_api_key, settings.vision_base_url, settings.vision_model_name
+_MODELS_URL = f"{_BASE_URL.rstrip('/')}/models"
+
+@lru_cache(maxsize=1)
+def _http_client() -> httpx.AsyncClient:
+    """VisionAgent 的 LLM 與連線暖機共用的 HTTP 連線池"""
+    return httpx.AsyncClient(timeout=60)
+
+@lru_cache(maxsize=1)
+def get_vision_agent() -> VisionAgent:
+    """同一 process 內共用一個 VisionAgent，重複執行測試時沿用既有的 LLM client"""
+    return VisionAgent(http_async_client=_http_client())
+
+async def _warm_connection() -> bool:
+    """預先建立到視覺模型端點的 TCP/TLS 連線，之後的 LLM 呼叫直接沿用"""
+    try:
+        await _http_client().get(
+            _MODELS_URL,
+            headers={"Authorization": f"Bearer {_API_KEY}"}
+        )
+        return True
+    except Exception:
+        return False
+
+# 100x100 紅色方塊 JPEG，直接內嵌以省去測試時載入 PIL 與編碼；需更換時以下列程式重新產生：
+#   img = Image.new('RGB', (100, 100), color='red')
+#   buffer = io.BytesIO()
+#   img.save(buffer, format='JPEG', optimize=True)
+#   print(buffer.getvalue().hex())
+_JPEG_100_RED = bytes.fromhex(
+    "ffd8ffe000104a46494600010100000100010000ffdb00430008060607060508070707090908"
+    "0a0c140d0c0b0b0c1912130f141d1a1f1e1d1a1c1c20242e2720222c231c1c2837292c303134"
+    "34341f27393d38323c2e333432ffdb0043010909090c0b0c180d0d1832211c21323232323232"
+    "3232323232323232323232323232323232323232323232323232323232323232323232323232"
+    "323232323232ffc00011080064006403012200021101031101ffc40015000101000000000000"
+    "00000000000000000006ffc40014100100000000000000000000000000000000ffc400160101"
+    "010100000000000000000000000000000607ffc4001411010000000000000000000000000000"
+    "0000ffda000c03010002110311003f008b0132dc400000000000000000000000000000000000"
+    "0000000000000000000000000000000000000000000000000000000000000000000000000000"
+    "000000000000000000000000000000001fffd9"
+)
+_RED_SQUARE_B64 = base64.b64encode(_JPEG_100_RED).decode('utf-8')
 
 async def test_vision_agent():
     """測試 VisionAgent 的基本功能"""
-    print("=== VisionAgent 診斷測試 ===")
+    console.info("=== VisionAgent 診斷測試 ===")
     
     # 1. 測試 settings 配置
-    print(f"VISION_API_KEY: {settings.vision_api_key[:10]}...")
-    print(f"VISION_BASE_URL: {settings.vision_base_url}")
-    print(f"VISION_MODEL_NAME: {settings.vision_model_name}")
-    
-    # 2. 創建 VisionAgent
-    try:
-        agent = VisionAgent()
-        print("✅ VisionAgent 創建成功")
-    except Exception as e:
-        print(f"❌ VisionAgent 創建失敗: {e}")
-        return
+    console.info(
+        f"VISION_API_KEY: {_API_KEY[:10]}...\n"
+        f"VISION_BASE_URL: {_BASE_URL}\n"
+        f"VISION_MODEL_NAME: {_MODEL}"
+    )
     
-    # 3. 測試 LLM 初始化
-    try:
-        llm = agent.llm
-        print(f"✅ LLM 初始化成功: {type(llm)}")
-    except Exception as e:
-        print(f"❌ LLM 初始化失敗: {e}")
-        return
-    
-    # 4. 創建一個簡單的測試圖片
-    try:
-        # 創建一個簡單的紅色方塊圖片
-        img = Image.new('RGB', (100, 100), color='red')
-        buffer = io.BytesIO()
-        img.save(buffer, format='JPEG')
-        image_data = base64.b64encode(buffer.getvalue()).decode('utf-8')
-        print(f"✅ 測試圖片創建成功，大小: {len(image_data)} 字元")
-    except Exception as e:
-        print(f"❌ 測試圖片創建失敗: {e}")
-        return
+    # 建立 VisionAgent 的同時先暖機 LLM 連線
+    http = _http_client()
+    warmup = asyncio.create_task(_warm_connection())
     
-    # 5. 測試情緒分析
     try:
-        print("🔍 開始情緒分析測試...")
-        result = await agent.analyze_emotion(image_data)
-        print(f"✅ 情緒分析完成: {result}")
-    except Exception as e:
-        print(f"❌ 情緒分析失敗: {e}")
-        import traceback
-        traceback.print_exc()
+        # 2. 創建 VisionAgent（在執行緒中建構，不阻塞暖機連線）
+        try:
+            agent = await asyncio.to_thread(get_vision_agent)
+            console.info("✅ VisionAgent 創建成功")
+        except Exception as e:
+            console.info(f"❌ VisionAgent 創建失敗: {e}")
+            return
+        
+        # 3. 測試 LLM 初始化
+        try:
+            llm = agent.llm
+            console.info(f"✅ LLM 初始化成功: {type(llm)}")
+        except Exception as e:
+            console.info(f"❌ LLM 初始化失敗: {e}")
+            return
+        
+        # 4. 測試圖片（內嵌的紅色方塊）
+        image_data = _RED_SQUARE_B64
+        console.info(f"✅ 測試圖片載入成功，大小: {len(image_data)} 字元")
+        
+        # 5. 測試情緒分析
+        try:
+            if await warmup:
+                console.info("✅ LLM 連線暖機完成")
+            console.info("🔍 開始情緒分析測試...")
+            result = await agent.analyze_emotion(image_data)
+            console.info(f"✅ 情緒分析完成: {result}")
+        except Exception as e:
+            # 追蹤訊息同樣經由佇列輸出，不會與其他輸出交錯
+            console.exception(f"❌ 情緒分析失敗: {e}")
+    finally:
+        # 關閉共用連線池；快取的 Agent 綁定此連線池，一併清除以免之後沿用已關閉的 client
+        warmup.cancel()
+        await http.aclose()
+        get_vision_agent.cache_clear()
+        _http_client.cache_clear()
 
 if __name__ == "__main__":
-    asyncio.run(test_vision_agent())
+    run(test_vision_agent())